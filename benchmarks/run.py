@@ -0,0 +1,313 @@
+"""Benchmarks of the interface and clustering paths on synthetic data.
+
+Each benchmark is timed, then run a second time to record its peak Python
+memory (``tracemalloc``, which also sees NumPy allocations; worker processes
+are not included). Tracing slows allocations down by different amounts per
+benchmark, so it is never on while timing. Benchmarks run on synthetic
+customer tables at the requested scales of the real data. Every
+result is appended as one JSON line to the history file, and compared with
+the median of the previous runs of the same benchmark and scale.
+
+Usage (from the repository root)::
+
+    python benchmarks/run.py --scales 1 10 100
+    python benchmarks/run.py --scales 1 --only kmeans dbscan --fail-on-regression
+    python benchmarks/run.py --scales 1 10 --no-memory
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'interface'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import plotly.express as px  # noqa: E402
+
+import clustering  # noqa: E402
+import data_store  # noqa: E402
+import density  # noqa: E402
+import figures  # noqa: E402
+import hierarchy  # noqa: E402
+import lod  # noqa: E402
+import scoring  # noqa: E402
+import silhouette  # noqa: E402
+import som  # noqa: E402
+import sorted_index  # noqa: E402
+import synthetic  # noqa: E402
+
+DATA_DIR = os.path.join(data_store.CACHE_DIR, 'benchmarks')
+STORE_DIR = os.path.join(DATA_DIR, 'columnar')
+GRAPH_DIR = os.path.join(DATA_DIR, 'graph')
+HISTORY_FILE = os.path.join('benchmarks', 'history.jsonl')
+
+# Benchmarks whose cost grows faster than linearly only run up to these sizes
+# (scikit-learn's DBSCAN is killed for lack of memory at 10x on a 5 GB machine,
+# and the neighbour graph has about 2 GB of edges at 100k rows); use fractional
+# scales such as --scales 0.5 1 2 3 for their scaling curves
+MAX_ROWS = {
+    'dbscan': 100000,
+    'neighbour_graph': 100000,
+    'dbscan_sweep': 100000,
+    'silhouette_exact': 40000,
+    'silhouette_estimate': 400000,
+    'scatter_3d_full': 400000,
+}
+# Benchmarks always run before the ones that use their state
+REQUIRES = {'dbscan_sweep': ['neighbour_graph']}
+ALWAYS_RUN = ['load', 'store_build', 'age_filter']
+DBSCAN_FEATURES = 'purchase_behavior'
+MIN_SAMPLES = list(range(2, 31, 4))
+AGE_RANGE = (25, 40)
+POINT_BUDGET = 20000
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_SECONDS = 0.05  # shorter differences are timer noise
+
+
+def measure(fn, memory=True):
+    """Return the result and wall time of ``fn``, and the peak memory (MiB) of a second, traced run."""
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    if not memory:
+        return result, seconds, None
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+
+def scatter(df):
+    """The Final Clusterization figure for a frame of customers."""
+    return px.scatter_3d(
+        df,
+        x='log_order_rate_per_week',
+        y='log_amount_spent_per_week',
+        z='chain_percentage',
+        color='merged_labels',
+        color_discrete_sequence=['#E41A1C', '#4DAF4A', '#377EB8'],
+    )
+
+
+def scaled_features(pipeline, df, feature_set):
+    names = clustering.FEATURE_SETS[feature_set]
+    Z = pipeline.transform(df[pipeline.feature_names].to_numpy())
+    return Z[:, [pipeline.feature_names.index(name) for name in names]]
+
+
+def benchmarks(path, pipeline):
+    """(name, function) pairs; each function returns a dict of extra measurements."""
+    state = {}
+
+    def load():
+        state['df'] = pd.read_pickle(path)
+        return {'rows': len(state['df'])}
+
+    def store_build():
+        # Always a cold build, into a directory of its own
+        shutil.rmtree(STORE_DIR, ignore_errors=True)
+        state['store'] = data_store.open_store(path, store_dir=STORE_DIR)
+        return {}
+
+    def age_filter():
+        age = state['df']['customer_age']
+        selected = state['df'][(age >= AGE_RANGE[0]) & (age <= AGE_RANGE[1])]
+        state['filtered'] = selected
+        return {'selected': len(selected)}
+
+    def age_filter_index():
+        index = sorted_index.SortedColumnIndex(state['store'], 'customer_age')
+        rows = sorted_index.select_rows({'customer_age': index}, {'customer_age': AGE_RANGE})
+        return {'selected': len(rows)}
+
+    def scatter_3d_full():
+        fig = scatter(state['filtered'])
+        return {'points': len(state['filtered']), 'json_bytes': len(fig.to_json())}
+
+    def scatter_3d_lod():
+        filtered = state['filtered']
+        sample = filtered.iloc[lod.stratified_sample(filtered['merged_labels'].to_numpy(), POINT_BUDGET)]
+        fig = scatter(sample)
+        return {'points': len(sample), 'json_bytes': len(fig.to_json())}
+
+    def scatter_3d_compact():
+        # The same sample as float32 traces per cluster, as the interface plots it
+        filtered = state['filtered']
+        sample = filtered.iloc[lod.stratified_sample(filtered['merged_labels'].to_numpy(), POINT_BUDGET)]
+        split = figures.ClusterSplit(sample['merged_labels'].to_numpy())
+        axes = ('log_order_rate_per_week', 'log_amount_spent_per_week', 'chain_percentage')
+        fig = figures.scatter_3d(split.clusters, [split.split(sample[axis].to_numpy()) for axis in axes], axes)
+        return {'points': len(sample), 'json_bytes': len(fig.to_json())}
+
+    def kmeans():
+        X = scaled_features(pipeline, state['df'], 'demographics_preferences')
+        params = clustering.default_params('kmeans', 'demographics_preferences')
+        labels, _ = clustering.ALGORITHMS['kmeans'][1](X, **params)
+        return {'clusters': int(labels.max()) + 1}
+
+    def dbscan():
+        X = scaled_features(pipeline, state['df'], 'purchase_behavior')
+        params = clustering.default_params('dbscan', 'purchase_behavior')
+        labels, metrics = clustering.ALGORITHMS['dbscan'][1](X, **params)
+        return {'clusters': int(labels.max()) + 1, 'noise': metrics['noise']}
+
+    def neighbour_graph():
+        # The path of the interface's DBSCAN explorer; always a cold build
+        shutil.rmtree(GRAPH_DIR, ignore_errors=True)
+        X = scaled_features(pipeline, state['df'], DBSCAN_FEATURES)
+        state['graph'] = density.NeighbourGraph.build(X, density.MAX_EPS[DBSCAN_FEATURES], GRAPH_DIR)
+        return {'edges': len(state['graph'].indices)}
+
+    def dbscan_sweep():
+        eps = clustering.default_params('dbscan', DBSCAN_FEATURES)['eps']
+        sweep = state['graph'].sweep([eps], MIN_SAMPLES)
+        return {'settings': len(sweep), 'max_clusters': int(sweep['clusters'].max())}
+
+    def silhouette_exact():
+        X = scaled_features(pipeline, state['df'], 'demographics_preferences')
+        result = silhouette.silhouette(X, state['df']['demographics_labels'].to_numpy())
+        return {'score': round(result['score'], 4)}
+
+    def silhouette_estimate():
+        X = scaled_features(pipeline, state['df'], 'demographics_preferences')
+        result = silhouette.estimate_silhouette(X, state['df']['demographics_labels'].to_numpy())
+        return {'score': round(result['score'], 4), 'interval': round(result['upper'] - result['lower'], 4)}
+
+    def som_train():
+        # Trained directly: the codebook cache would otherwise turn reruns into file reads
+        X = scaled_features(pipeline, state['df'], 'demographics_preferences')
+        trained = som.SOM().train(X)
+        return {'quantization_error': trained.quantization_error(X)}
+
+    def hierarchical():
+        X = scaled_features(pipeline, state['df'], 'demographics_preferences')
+        tree = hierarchy.Hierarchy.fit(X)
+        return {'micro_clusters': len(tree.micro), 'clusters': len(np.unique(tree.labels([6])[6]))}
+
+    def merged_mapping():
+        labels = pipeline.score_array(state['df'][pipeline.feature_names].to_numpy())
+        agreement = (labels[scoring.MERGED_LABEL] == state['df'][scoring.MERGED_LABEL].to_numpy()).mean()
+        return {'agreement': float(agreement)}
+
+    return [
+        ('load', load),
+        ('store_build', store_build),
+        ('age_filter', age_filter),
+        ('age_filter_index', age_filter_index),
+        ('scatter_3d_full', scatter_3d_full),
+        ('scatter_3d_lod', scatter_3d_lod),
+        ('scatter_3d_compact', scatter_3d_compact),
+        ('kmeans', kmeans),
+        ('dbscan', dbscan),
+        ('neighbour_graph', neighbour_graph),
+        ('dbscan_sweep', dbscan_sweep),
+        ('silhouette_exact', silhouette_exact),
+        ('silhouette_estimate', silhouette_estimate),
+        ('som', som_train),
+        ('hierarchical', hierarchical),
+        ('merged_mapping', merged_mapping),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline(history, name, scale):
+    """Median time of the previous successful runs of a benchmark at a scale."""
+    times = [r['seconds'] for r in history if r['benchmark'] == name and r['scale'] == scale and 'seconds' in r]
+    return float(np.median(times)) if times else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the interface and clustering paths on synthetic data.')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100], help='multiples of the real data size')
+    parser.add_argument('--only', nargs='+', help='names of the benchmarks to run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--history', default=HISTORY_FILE, help='JSONL file the results are appended to')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the traced second run of every benchmark that measures its peak memory')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help=f'exit with an error when a benchmark is {REGRESSION_RATIO}x slower than its baseline')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    history = read_history(args.history)
+    pipeline = scoring.build_pipeline()
+    run = {
+        'run_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+    selected = set(ALWAYS_RUN)
+    for name in args.only or []:
+        selected.update([name] + REQUIRES.get(name, []))
+
+    regressions = []
+    for scale in args.scales:
+        scale = int(scale) if float(scale).is_integer() else scale
+        path = synthetic.write_customers(scale, DATA_DIR, seed=args.seed)
+        rows = None
+        for name, fn in benchmarks(path, pipeline):
+            if args.only and name not in selected:
+                continue
+            record = dict(run, benchmark=name, scale=scale, rows=rows)
+            if rows is not None and rows > MAX_ROWS.get(name, float('inf')):
+                record['skipped'] = f'more than {MAX_ROWS[name]:,} rows'
+                print(f'{scale:>5}x {name:<20} skipped ({record["skipped"]})')
+            else:
+                extra, seconds, peak = measure(fn, memory=not args.no_memory)
+                rows = extra.get('rows', rows)
+                record.update(seconds=round(seconds, 4), **extra)
+                if peak is not None:
+                    record['peak_mb'] = round(peak, 2)
+
+                previous = baseline(history, name, scale)
+                change = ''
+                if previous:
+                    ratio = seconds / previous
+                    change = f' ({ratio:.2f}x baseline)'
+                    if ratio > REGRESSION_RATIO and seconds - previous > REGRESSION_MIN_SECONDS:
+                        regressions.append(f'{name} at {scale}x: {seconds:.3f}s vs {previous:.3f}s')
+                details = ', '.join(f'{k}={v:,}' if isinstance(v, int) else f'{k}={v}' for k, v in extra.items())
+                memory = f'{peak:9.1f} MiB' if peak is not None else ' ' * 13
+                print(f'{scale:>5}x {name:<20} {seconds:9.3f}s {memory}{change}  {details}')
+
+            os.makedirs(os.path.dirname(args.history) or '.', exist_ok=True)
+            with open(args.history, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    if regressions:
+        print('Regressions:', *regressions, sep='\n  ')
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Synthetic customer tables with the schema of ``customer_id_merged_unscaled.pkl``.
+
+Every (demographics, purchase behavior, merged) label combination of the real
+customers becomes a multivariate normal over the seven features, with the
+mean and covariance of its members. A table at ``scale`` times the real size
+draws each combination in proportion to its real frequency, clipped to the
+real ranges, so clusters, correlations and value ranges look like the real
+data while the number of rows grows freely.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import atomic_save
+
+SOURCE_FILE = 'customer_id_merged_unscaled.pkl'
+FEATURES = [
+    'customer_age', 'Recency', 'average_product_price', 'chain_percentage',
+    'log_vendor_count', 'log_order_rate_per_week', 'log_amount_spent_per_week',
+]
+LABELS = ['demographics_labels', 'purchase_behavior_labels', 'merged_labels']
+
+
+def generate_customers(scale=1, seed=0, source_path=SOURCE_FILE):
+    """DataFrame of ``scale`` times as many synthetic customers as the source file."""
+    source = pd.read_pickle(source_path)
+    rng = np.random.default_rng(seed)
+    lo = source[FEATURES].min().to_numpy()
+    hi = source[FEATURES].max().to_numpy()
+
+    parts = []
+    for combination, members in source.groupby(LABELS):
+        n = int(round(len(members) * scale))
+        values = members[FEATURES].to_numpy()
+        covariance = np.cov(values, rowvar=False) if len(values) > 1 else np.zeros((len(FEATURES),) * 2)
+        sample = rng.multivariate_normal(values.mean(axis=0), covariance, size=n, method='eigh')
+        part = pd.DataFrame(np.clip(sample, lo, hi), columns=FEATURES)
+        for column, value in zip(LABELS, combination):
+            part[column] = value
+        parts.append(part)
+
+    customers = pd.concat(parts, ignore_index=True).sample(frac=1, random_state=seed).reset_index(drop=True)
+    customers['customer_age'] = customers['customer_age'].round()
+    for column in LABELS:
+        customers[column] = customers[column].astype(source[column].dtype)
+
+    ids = rng.integers(0, 16 ** 10, size=len(customers))
+    customers.index = pd.Index([f'{i:010x}' for i in ids], name=source.index.name)
+    return customers[source.columns]
+
+
+def write_customers(scale, directory, seed=0, source_path=SOURCE_FILE):
+    """Pickle a synthetic table (once per scale and seed) and return its path."""
+    path = os.path.join(directory, f'customers_{scale}x_seed{seed}.pkl')
+    if not os.path.exists(path):
+        customers = generate_customers(scale, seed, source_path)
+        atomic_save(path, customers.to_pickle)
+    return path
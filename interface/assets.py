@@ -0,0 +1,128 @@
+"""Manifest of the static plots under ``interface/plots``.
+
+The tree is scanned once at startup. Every image gets its file metadata and a
+key made of its path relative to the plots directory without the extension,
+so pages can refer to ``'clustering/purchase/elbow_method'`` regardless of
+the image format. Pages are served down-scaled, recompressed variants kept in
+memory; the original file is only read when full resolution is requested.
+"""
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+PLOTS_DIR = 'interface/plots'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Maximum width in pixels of each variant served from memory
+VARIANT_WIDTHS = {
+    'thumbnail': 320,
+    'display': 1000,
+}
+# JPEG is passed through by st.image as is; other formats get re-encoded on every call
+VARIANT_FORMAT = 'JPEG'
+VARIANT_QUALITY = 85
+
+
+class PlotAsset:
+    """Metadata of a single plot image."""
+
+    def __init__(self, root, path):
+        self.path = path
+        relative = os.path.relpath(path, root).replace(os.sep, '/')
+        self.key, self.extension = os.path.splitext(relative)
+        self.directory, self.name = os.path.split(self.key)
+
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        with Image.open(path) as image:
+            self.width, self.height = image.size
+
+    def __repr__(self):
+        return f'PlotAsset({self.key!r}, {self.width}x{self.height}, {self.size} bytes)'
+
+
+def _encode_variant(path, max_width):
+    """Resize an image to ``max_width`` and recompress it, flattening alpha on white."""
+    with Image.open(path) as image:
+        image.load()
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            flat = Image.new('RGB', image.size, (255, 255, 255))
+            flat.paste(image, mask=image.getchannel('A'))
+            image = flat
+        else:
+            image = image.convert('RGB')
+
+        if image.width > max_width:
+            height = round(image.height * max_width / image.width)
+            image = image.resize((max_width, height), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+class AssetManifest:
+    """All plot images under ``root`` with their cached variants."""
+
+    def __init__(self, root=PLOTS_DIR):
+        self.root = root
+        self.assets = {}
+        for directory, _, files in os.walk(root):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    asset = PlotAsset(root, os.path.join(directory, name))
+                    self.assets[asset.key] = asset
+
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.assets
+
+    def resolve(self, key):
+        """Asset for a key, with or without extension."""
+        key = key.replace(os.sep, '/')
+        if key not in self.assets:
+            key = os.path.splitext(key)[0]
+        return self.assets[key]
+
+    def listdir(self, directory):
+        """Assets located directly in ``directory`` (relative to the root), sorted by name."""
+        directory = directory.strip('/')
+        return sorted(
+            (asset for asset in self.assets.values() if asset.directory == directory),
+            key=lambda asset: asset.name
+        )
+
+    def variant(self, key, name='display'):
+        """Encoded bytes of a down-scaled variant, built on first use and kept in memory."""
+        asset = self.resolve(key)
+        cache_key = (asset.key, name)
+        data = self._variants.get(cache_key)
+        if data is None:
+            data = _encode_variant(asset.path, VARIANT_WIDTHS[name])
+            with self._lock:
+                self._variants[cache_key] = data
+        return data
+
+    def original(self, key):
+        """Bytes of the full-resolution file, read from disk on every call."""
+        with open(self.resolve(key).path, 'rb') as f:
+            return f.read()
+
+    def warm(self, names=('display', 'thumbnail'), max_workers=4):
+        """Build all variants in background threads; returns immediately."""
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='plot-variants')
+        for key in self.assets:
+            for name in names:
+                executor.submit(self.variant, key, name)
+        executor.shutdown(wait=False)
+
+    def memory_usage(self):
+        """Total bytes of the variants currently held in memory."""
+        return sum(len(data) for data in self._variants.values())
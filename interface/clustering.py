@@ -0,0 +1,257 @@
+"""Clustering of the customer segments computed live from the preprocessed data.
+
+Reproduces the clusterings of ``clustering_versao_final_v6.ipynb`` on the
+``demographics_preferences`` and ``purchase_behavior`` feature sets, with the
+parameters chosen in the interface. Results are cached on disk by feature set,
+algorithm, parameters and data version.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.cluster import DBSCAN, AgglomerativeClustering, KMeans
+
+import density
+import hierarchy
+import k_sweep
+import silhouette
+import som
+from result_cache import make_key
+
+DATA_FILE = 'preprocessed_data_numerical.pkl'
+
+FEATURE_SETS = {
+    'demographics_preferences': ['customer_age', 'Recency', 'log_order_rate_per_week', 'log_amount_spent_per_week'],
+    'purchase_behavior': ['average_product_price', 'chain_percentage', 'log_vendor_count'],
+}
+
+
+def load_features(store, feature_set):
+    """Matrix (n_samples, n_features) of a feature set from the data store."""
+    return np.column_stack([store.column(name) for name in FEATURE_SETS[feature_set]]).astype(float)
+
+
+def _run_kmeans(X, n_clusters=3, n_init=15, random_state=1, progress=None):
+    """K-means keeping the best of ``n_init`` runs, reporting after each run."""
+    seeds = np.random.RandomState(random_state).randint(np.iinfo(np.int32).max, size=n_init)
+    best = None
+    for run, seed in enumerate(seeds, start=1):
+        model = KMeans(n_clusters=n_clusters, init='k-means++', n_init=1, random_state=seed).fit(X)
+        if best is None or model.inertia_ < best.inertia_:
+            best = model
+        if progress is not None:
+            progress(run / n_init, f'Initialisation {run}/{n_init}')
+    return best.labels_, {'inertia': float(best.inertia_)}
+
+
+def _run_dbscan(X, eps=1.0, min_samples=3, progress=None):
+    if progress is not None:
+        progress(0.0, 'Finding neighbourhoods')
+    labels = DBSCAN(eps=eps, min_samples=min_samples, n_jobs=-1).fit_predict(X)
+    return labels, {'noise': int((labels == -1).sum())}
+
+
+def _run_hierarchical(X, n_clusters=3, linkage='ward', progress=None):
+    """Hierarchical clustering of every customer through weighted micro-clusters."""
+    tree = hierarchy.Hierarchy.fit(X, method=linkage, progress=progress)
+    return tree.labels([n_clusters])[n_clusters], {'micro_clusters': len(tree.micro)}
+
+
+def _map_nodes(X, node_labels, trained, progress=None):
+    """Labels of the customers from the labels of their best-matching nodes."""
+    if progress is not None:
+        progress(0.95, 'Mapping customers to nodes')
+    bmus, distances = trained.find_bmu(X)
+    return node_labels[bmus], {'quantization_error': float(distances.mean())}
+
+
+def _run_som_kmeans(X, n_clusters=4, n_init=20, random_state=42, progress=None):
+    """K-means on the codebook of the shared SOM, as in the notebook."""
+    trained = som.trained_som(X, progress=progress)
+    kmeans = KMeans(n_clusters=n_clusters, init='k-means++', n_init=n_init, random_state=random_state)
+    node_labels = kmeans.fit_predict(trained.codebook)
+    return _map_nodes(X, node_labels, trained, progress)
+
+
+def _run_som_hierarchical(X, n_clusters=6, linkage='ward', progress=None):
+    """Agglomerative clustering of the codebook of the shared SOM."""
+    trained = som.trained_som(X, progress=progress)
+    node_labels = AgglomerativeClustering(n_clusters=n_clusters, linkage=linkage).fit_predict(trained.codebook)
+    return _map_nodes(X, node_labels, trained, progress)
+
+
+# name -> (label, function, default parameters per feature set)
+ALGORITHMS = {
+    'kmeans': (
+        'K-means',
+        _run_kmeans,
+        {
+            'demographics_preferences': {'n_clusters': 3, 'n_init': 15, 'random_state': 1},
+            'purchase_behavior': {'n_clusters': 3, 'n_init': 15, 'random_state': 1},
+        },
+    ),
+    'dbscan': (
+        'DBSCAN',
+        _run_dbscan,
+        {
+            'demographics_preferences': {'eps': 1.0, 'min_samples': 3},
+            'purchase_behavior': {'eps': 0.30, 'min_samples': 4},
+        },
+    ),
+    'hierarchical': (
+        'Hierarchical (micro-clusters)',
+        _run_hierarchical,
+        {
+            'demographics_preferences': {'n_clusters': 3, 'linkage': 'ward'},
+            'purchase_behavior': {'n_clusters': 3, 'linkage': 'ward'},
+        },
+    ),
+    'som_kmeans': (
+        'SOM + K-means',
+        _run_som_kmeans,
+        {
+            'demographics_preferences': {'n_clusters': 4, 'n_init': 20, 'random_state': 42},
+            'purchase_behavior': {'n_clusters': 3, 'n_init': 20, 'random_state': 42},
+        },
+    ),
+    'som_hierarchical': (
+        'SOM + Hierarchical',
+        _run_som_hierarchical,
+        {
+            'demographics_preferences': {'n_clusters': 6, 'linkage': 'ward'},
+            'purchase_behavior': {'n_clusters': 6, 'linkage': 'ward'},
+        },
+    ),
+}
+
+
+def default_params(algorithm, feature_set):
+    return dict(ALGORITHMS[algorithm][2][feature_set])
+
+
+def cluster_profile(X, labels, feature_names):
+    """Mean of every feature and size of each cluster (as in ``cluster_profiles``)."""
+    values, codes = np.unique(labels, return_inverse=True)
+    counts = np.bincount(codes)
+    means = np.column_stack([np.bincount(codes, weights=X[:, j]) / counts for j in range(X.shape[1])])
+    profile = pd.DataFrame(means, index=pd.Index(values, name='cluster'), columns=feature_names)
+    return profile, pd.Series(counts, index=profile.index, name='counts')
+
+
+def run_clustering(store, feature_set, algorithm, params, progress=None):
+    """Cluster a feature set and summarise the result.
+
+    Returns a dict with the ``labels`` of every customer, the cluster
+    ``profile`` (feature means), the cluster ``counts`` and algorithm specific
+    ``metrics``, plus an estimated silhouette score with its 95% interval.
+    """
+    X = load_features(store, feature_set)
+    labels, metrics = ALGORITHMS[algorithm][1](X, progress=progress, **params)
+    profile, counts = cluster_profile(X, labels, FEATURE_SETS[feature_set])
+    if 2 <= len(counts) < len(X):
+        estimate = silhouette.estimate_silhouette(X, labels, n_jobs=1)
+        metrics['silhouette'] = (estimate['score'], estimate['lower'], estimate['upper'])
+    return {
+        'feature_set': feature_set,
+        'algorithm': algorithm,
+        'params': params,
+        'data_version': store.version,
+        'labels': np.asarray(labels),
+        'profile': profile,
+        'counts': counts,
+        'metrics': metrics,
+    }
+
+
+def result_key(store, feature_set, algorithm, params):
+    return make_key('clustering', feature_set, algorithm, params, store.version)
+
+
+def cached_clustering(cache, store, feature_set, algorithm, params, progress=None):
+    """``run_clustering`` through the result cache."""
+    key = result_key(store, feature_set, algorithm, params)
+    return cache.get_or_compute(key, lambda: run_clustering(store, feature_set, algorithm, params, progress))
+
+
+def r2_sweep_key(store, feature_set, min_k=2, max_k=10):
+    return make_key('r2_sweep', feature_set, min_k, max_k, hierarchy.N_MICRO, store.version)
+
+
+def cached_r2_sweep(cache, store, feature_set, min_k=2, max_k=10, progress=None):
+    """R² of K-means and every linkage for ``range(min_k, max_k)`` clusters, cached."""
+    key = r2_sweep_key(store, feature_set, min_k, max_k)
+    return cache.get_or_compute(
+        key, lambda: k_sweep.r2_sweep(load_features(store, feature_set), min_k=min_k, max_k=max_k, progress=progress)
+    )
+
+
+def hierarchy_key(store, feature_set, method='ward'):
+    return make_key('hierarchy', feature_set, method, hierarchy.N_MICRO, store.version)
+
+
+def cached_hierarchy(cache, store, feature_set, method='ward', progress=None):
+    """Tree of a feature set over weighted micro-clusters (for dendrograms and cuts), cached."""
+    key = hierarchy_key(store, feature_set, method)
+    return cache.get_or_compute(
+        key, lambda: hierarchy.Hierarchy.fit(load_features(store, feature_set), method=method, progress=progress)
+    )
+
+
+def neighbour_graph_key(store, feature_set):
+    return make_key('neighbour_graph', feature_set, density.MAX_EPS[feature_set], store.version)
+
+
+def open_neighbour_graph(store, feature_set, progress=None):
+    """Cached radius-neighbour graph of a feature set (built on first use)."""
+    return density.open_graph(
+        lambda: load_features(store, feature_set), feature_set, store.version, progress=progress
+    )
+
+
+def dbscan_sweep_key(store, feature_set, eps, min_samples_values):
+    return make_key('dbscan_sweep', feature_set, eps, list(min_samples_values), store.version)
+
+
+def cached_dbscan_sweep(cache, store, feature_set, eps, min_samples_values, progress=None):
+    """Clusters and noise for every min_samples at a given eps, from the shared graph."""
+    key = dbscan_sweep_key(store, feature_set, eps, min_samples_values)
+    return cache.get_or_compute(
+        key, lambda: open_neighbour_graph(store, feature_set).sweep([eps], list(min_samples_values), progress=progress)
+    )
+
+
+def silhouette_sweep_key(store, feature_set, exact, min_k=2, max_k=11):
+    return make_key('silhouette_sweep', feature_set, exact, min_k, max_k, store.version)
+
+
+def silhouette_sweep(store, feature_set, exact=False, min_k=2, max_k=11, progress=None):
+    """Silhouette of K-means for every k in ``range(min_k, max_k)`` (the notebook's silhouette analysis).
+
+    Returns a dict with the ``scores`` (DataFrame of score and interval per
+    number of clusters) and the silhouette ``results`` of every k.
+    """
+    X = load_features(store, feature_set)
+    ks = list(range(min_k, max_k))
+    if progress is not None:
+        progress(0.0, 'Fitting K-means')
+    labels = k_sweep.kmeans_labels(X, ks, n_init=15, random_state=1)
+
+    results = {}
+    for step, k in enumerate(ks):
+        report = None
+        if progress is not None:
+            report = lambda fraction, message, step=step: progress((step + fraction) / len(ks), f'k={ks[step]}: {message}')
+        if exact:
+            results[k] = silhouette.silhouette(X, labels[k], progress=report)
+        else:
+            results[k] = silhouette.estimate_silhouette(X, labels[k], progress=report)
+        results[k]['labels'] = labels[k]
+
+    scores = pd.DataFrame(
+        {name: [results[k][name] for k in ks] for name in ['score', 'lower', 'upper']},
+        index=pd.Index(ks, name='n_clusters')
+    )
+    return {'scores': scores, 'results': results}
+
+
+def cached_silhouette_sweep(cache, store, feature_set, exact=False, min_k=2, max_k=11, progress=None):
+    key = silhouette_sweep_key(store, feature_set, exact, min_k, max_k)
+    return cache.get_or_compute(key, lambda: silhouette_sweep(store, feature_set, exact, min_k, max_k, progress))
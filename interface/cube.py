@@ -0,0 +1,116 @@
+"""Aggregate cube of the customer features for cluster profiles by age.
+
+Customers are grouped into cells by their merged, demographic and purchase
+behavior labels and their (integer) age. Each occupied cell keeps its count
+and the sums and sums of squares of the features, saved next to the columnar
+store. Profiles of an age range (sizes, means and variances per cluster) are
+then exact sums over the selected cells: a few hundred cells on the real
+data, bounded by labels times ages whatever the number of customers.
+
+Other filters cannot be answered from the cells without estimating, so
+profiles under them are computed exactly from the selected rows with
+``row_profile``.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import atomic_save
+
+LABEL_COLUMNS = ['merged_labels', 'demographics_labels', 'purchase_behavior_labels']
+AGE_COLUMN = 'customer_age'
+
+
+def _profile(groups, n_groups, counts, sums, sumsq, features):
+    """Sizes, means and variances per group from per-item counts, sums and sums of squares."""
+    counts = np.bincount(groups, counts, n_groups)
+    present = counts > 0
+    sums = np.column_stack([np.bincount(groups, s, n_groups) for s in sums.T])[present]
+    sumsq = np.column_stack([np.bincount(groups, s, n_groups) for s in sumsq.T])[present]
+
+    index = pd.Index(np.flatnonzero(present), name='cluster')
+    means = sums / counts[present, None]
+    variances = np.maximum(sumsq / counts[present, None] - means ** 2, 0)
+    return (
+        pd.DataFrame(means, index=index, columns=features),
+        pd.DataFrame(variances, index=index, columns=features),
+        pd.Series(np.round(counts[present]).astype(np.int64), index=index, name='counts'),
+    )
+
+
+def row_profile(store, rows, features, by='merged_labels'):
+    """Exact ``(means, variances, counts)`` per cluster of ``by`` over the given rows."""
+    labels = store.column(by)
+    X = np.column_stack([store.column(f)[rows] for f in features]).astype(float)
+    return _profile(
+        np.asarray(labels[rows], dtype=np.int64), int(labels.max()) + 1,
+        np.ones(len(X)), X, X ** 2, list(features)
+    )
+
+
+class AggregateCube:
+    """Counts, sums and sums of squares per occupied (labels, age) cell."""
+
+    def __init__(self, store, features):
+        self.features = list(features)
+        path = os.path.join(store.directory, 'cube_age.npz')
+
+        if not os.path.exists(path):
+            arrays = self._build(store)
+            atomic_save(path, lambda f: np.savez(f, **arrays))
+
+        with np.load(path) as data:
+            self.labels = data['labels']
+            self.ages = data['ages']
+            self.counts = data['counts']
+            self.sums = data['sums']
+            self.sumsq = data['sumsq']
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _build(self, store):
+        labels = np.column_stack([store.column(c) for c in LABEL_COLUMNS]).astype(np.int64)
+        ages = np.floor(store.column(AGE_COLUMN)).astype(np.int64)
+
+        # One integer key per cell (mixed radix over every dimension)
+        dimensions = np.column_stack([labels, ages - ages.min()])
+        radices = dimensions.max(axis=0) + 1
+        keys = np.zeros(store.n_rows, dtype=np.int64)
+        for column, radix in zip(dimensions.T, radices):
+            keys = keys * radix + column
+        _, first, cells = np.unique(keys, return_index=True, return_inverse=True)
+
+        n_cells = len(first)
+        X = np.column_stack([store.column(f) for f in self.features]).astype(float)
+        return {
+            'labels': labels[first].astype(np.int32),
+            'ages': ages[first].astype(np.int32),
+            'counts': np.bincount(cells, minlength=n_cells).astype(float),
+            'sums': np.column_stack([np.bincount(cells, X[:, j], n_cells) for j in range(X.shape[1])]),
+            'sumsq': np.column_stack([np.bincount(cells, X[:, j] ** 2, n_cells) for j in range(X.shape[1])]),
+        }
+
+    def profile(self, age_range, by='merged_labels'):
+        """Size, feature means and feature variances of every cluster within an age range.
+
+        Returns ``(means, variances, counts)``, indexed by the labels of ``by``
+        that have customers in the range.
+        """
+        lo, hi = age_range
+        mask = (self.ages >= lo) & (self.ages <= hi)
+        column = LABEL_COLUMNS.index(by)
+        return _profile(
+            self.labels[mask, column], int(self.labels[:, column].max()) + 1,
+            self.counts[mask], self.sums[mask], self.sumsq[mask], self.features
+        )
+
+    def totals(self):
+        """Mean and standard deviation of every feature over all customers."""
+        n = self.counts.sum()
+        means = self.sums.sum(axis=0) / n
+        return (
+            pd.Series(means, index=self.features),
+            pd.Series(np.sqrt(np.maximum(self.sumsq.sum(axis=0) / n - means ** 2, 0)), index=self.features),
+        )
@@ -0,0 +1,213 @@
+"""Read-only columnar store for the customer tables.
+
+The pickles exported from the notebooks are converted once into one ``.npy``
+file per column. The columns are then opened with memory mapping, so every
+Streamlit session in the process (and every process on the box) shares the
+same pages of the OS cache instead of unpickling its own copy of the table.
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = '.cache'
+STORE_DIR = os.path.join(CACHE_DIR, 'columnar')
+
+INDEX_FILE = '__index__.npy'
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'current.json'
+
+
+def source_signature(path):
+    """Cheap change detector for a source file: (size, mtime in ns)."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-1 of the file contents, used as the data version of the store."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _as_storable(values):
+    """Numpy array that can be saved without pickling (object -> unicode)."""
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    return np.ascontiguousarray(values)
+
+
+def _column_file(position):
+    return f'col_{position:03d}.npy'
+
+
+class ColumnStore:
+    """Memory-mapped, read-only view over one converted table.
+
+    Columns are returned as read-only ``np.memmap`` arrays; nothing is copied
+    until ``frame`` gathers the requested rows and columns into a DataFrame.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest['version']
+        self.n_rows = self.manifest['n_rows']
+        self.columns = [c['name'] for c in self.manifest['columns']]
+        self.stats = {c['name']: c['stats'] for c in self.manifest['columns'] if c['stats']}
+        self.index_name = self.manifest['index_name']
+
+        self._arrays = {
+            c['name']: np.load(os.path.join(directory, c['file']), mmap_mode='r')
+            for c in self.manifest['columns']
+        }
+        self._index = np.load(os.path.join(directory, INDEX_FILE), mmap_mode='r')
+
+    def __len__(self):
+        return self.n_rows
+
+    def __contains__(self, name):
+        return name in self._arrays
+
+    def column(self, name):
+        """Memory-mapped values of a single column."""
+        return self._arrays[name]
+
+    def index(self):
+        """Memory-mapped values of the original DataFrame index."""
+        return self._index
+
+    def frame(self, columns=None, rows=None):
+        """Materialise a DataFrame with only the given columns and rows.
+
+        ``rows`` may be a slice, an array of positions or a boolean mask. Only
+        the selected cells are read from the mapped files.
+        """
+        columns = self.columns if columns is None else list(dict.fromkeys(columns))
+        if rows is None:
+            rows = slice(None)
+        data = {name: np.asarray(self._arrays[name][rows]) for name in columns}
+        index = pd.Index(np.asarray(self._index[rows]), name=self.index_name)
+        return pd.DataFrame(data, index=index, columns=columns, copy=False)
+
+
+def build_store(source_path, version, directory):
+    """Convert a pickled DataFrame into per-column ``.npy`` files."""
+    with open(source_path, 'rb') as f:
+        df = pickle.load(f)
+
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.building-', dir=os.path.dirname(directory))
+    try:
+        columns = []
+        for position, name in enumerate(df.columns):
+            values = _as_storable(df[name].to_numpy())
+            np.save(os.path.join(tmp_dir, _column_file(position)), values)
+
+            stats = None
+            if np.issubdtype(values.dtype, np.number) and len(values):
+                stats = {'min': values.min().item(), 'max': values.max().item()}
+            columns.append({
+                'name': str(name),
+                'file': _column_file(position),
+                'dtype': values.dtype.str,
+                'stats': stats,
+            })
+        np.save(os.path.join(tmp_dir, INDEX_FILE), _as_storable(df.index.to_numpy()))
+
+        manifest = {
+            'source': os.path.abspath(source_path),
+            'version': version,
+            'n_rows': len(df),
+            'index_name': df.index.name,
+            'columns': columns,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        publish_directory(tmp_dir, directory, MANIFEST_FILE)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return directory
+
+
+def publish_directory(tmp_dir, directory, marker):
+    """Move a finished build from ``tmp_dir`` to ``directory``.
+
+    If another process published the same build first (``directory`` holds
+    its ``marker`` file), that build is kept and ``tmp_dir`` is discarded.
+    """
+    try:
+        os.rename(tmp_dir, directory)
+    except OSError:
+        if not os.path.exists(os.path.join(directory, marker)):
+            raise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def atomic_save(path, write, mode='wb'):
+    """Write ``path`` through ``write(f)`` under a temporary name, then move it into place.
+
+    Other sessions and processes see either the previous file or the
+    complete new one, never a partly written file.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return path
+
+
+def open_store(source_path, store_dir=STORE_DIR):
+    """Open the columnar copy of ``source_path``, (re)building it if stale.
+
+    The cheap (size, mtime) signature is checked first; the content hash is
+    only recomputed when the signature changed, so touching the file without
+    modifying it does not trigger a rebuild.
+    """
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    root = os.path.join(store_dir, stem)
+    current_path = os.path.join(root, CURRENT_FILE)
+    signature = list(source_signature(source_path))
+
+    current = None
+    if os.path.exists(current_path):
+        with open(current_path) as f:
+            current = json.load(f)
+
+    if current is None or current['signature'] != signature:
+        version = file_hash(source_path)
+        directory = os.path.join(root, version)
+        if not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+            build_store(source_path, version, directory)
+        os.makedirs(root, exist_ok=True)
+        atomic_save(current_path, lambda f: json.dump({'signature': signature, 'version': version}, f), mode='w')
+
+        # Old versions can go: processes still mapping them keep their pages
+        for entry in os.listdir(root):
+            entry_path = os.path.join(root, entry)
+            if entry != version and os.path.isdir(entry_path) and not entry.startswith('.'):
+                shutil.rmtree(entry_path, ignore_errors=True)
+        current = {'signature': signature, 'version': version}
+
+    return ColumnStore(os.path.join(root, current['version']))
@@ -0,0 +1,226 @@
+"""DBSCAN parameter sweeps from a single, cached radius-neighbour graph.
+
+The notebook refits ``DBSCAN`` for every ``min_samples`` and recomputes the
+neighbourhoods each time. Here the neighbour graph is built once for the
+largest ``eps`` of interest, with every row sorted by distance, and saved as
+memory-mapped arrays. DBSCAN labels for any ``eps <= max_eps`` and any
+``min_samples`` are then derived from it with array operations and a
+connected components pass over the core points. The k-distance curve used to
+choose ``eps`` is stored alongside.
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.neighbors import KDTree
+
+from data_store import CACHE_DIR, publish_directory
+from result_cache import make_key
+
+GRAPHS_DIR = os.path.join(CACHE_DIR, 'graphs')
+
+# Largest eps kept in the graph per feature set; the number of edges grows
+# quickly with eps (about 74M at 1.0 on the demographic features)
+MAX_EPS = {
+    'demographics_preferences': 1.0,
+    'purchase_behavior': 0.4,
+}
+K_DISTANCE_NEIGHBORS = 27
+BLOCK_ROWS = 4096
+BLOCK_EDGES = 1 << 22
+
+
+def find_elbow(values):
+    """Index of the elbow of an increasing curve.
+
+    The curve and its positions are scaled to [0, 1]; the elbow is the point
+    furthest below the straight line joining the first and last points.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 3 or values[-1] == values[0]:
+        return len(values) - 1
+    x = np.linspace(0, 1, len(values))
+    y = (values - values[0]) / (values[-1] - values[0])
+    return int(np.argmax(x - y))
+
+
+class NeighbourGraph:
+    """Sorted radius-neighbour graph (CSR arrays) and k-distances of a dataset."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        load = lambda name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+        self.indptr = load('indptr')
+        self.indices = load('indices')
+        self.distances = load('distances')
+        self.k_distances = load('k_distances')
+        self.max_eps = float(np.load(os.path.join(directory, 'max_eps.npy')))
+        self.n = len(self.indptr) - 1
+        self._row_lengths = np.diff(self.indptr)
+        self._last_eps = None
+
+    @classmethod
+    def build(cls, X, max_eps, directory, k_neighbors=K_DISTANCE_NEIGHBORS, progress=None):
+        """Compute the graph of ``X`` block by block and save it under ``directory``.
+
+        A first pass counts the neighbours of every row, which sizes the
+        memory-mapped edge arrays; a second pass fills them in blocks of at
+        most ``BLOCK_EDGES`` edges, so memory stays bounded whatever the
+        number of edges.
+        """
+        X = np.asarray(X, dtype=float)
+        n = len(X)
+        tree = KDTree(X)
+
+        # Querying with X itself keeps each point in its own row (explicit distance 0)
+        counts = np.concatenate([
+            tree.query_radius(X[start:start + BLOCK_ROWS], r=max_eps, count_only=True)
+            for start in range(0, n, BLOCK_ROWS)
+        ])
+        indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        n_edges = int(indptr[-1])
+
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix='.building-', dir=os.path.dirname(directory))
+        try:
+            path = lambda name: os.path.join(tmp_dir, f'{name}.npy')
+            np.save(path('indptr'), indptr)
+            indices = np.lib.format.open_memmap(path('indices'), mode='w+', dtype=np.int32, shape=(n_edges,))
+            distances = np.lib.format.open_memmap(path('distances'), mode='w+', dtype=np.float32, shape=(n_edges,))
+            k_distances = np.lib.format.open_memmap(
+                path('k_distances'), mode='w+', dtype=np.float32, shape=(n, k_neighbors)
+            )
+
+            start = 0
+            while start < n:
+                # Rows up to the edge budget (at least one row, at most BLOCK_ROWS)
+                stop = int(np.searchsorted(indptr, indptr[start] + BLOCK_EDGES, side='right')) - 1
+                stop = min(max(stop, start + 1), start + BLOCK_ROWS, n)
+                block_indices, block_distances = tree.query_radius(
+                    X[start:stop], r=max_eps, return_distance=True, sort_results=True
+                )
+                indices[indptr[start]:indptr[stop]] = np.concatenate(block_indices)
+                distances[indptr[start]:indptr[stop]] = np.concatenate(block_distances)
+                k_distances[start:stop] = tree.query(X[start:stop], k=k_neighbors)[0]
+                start = stop
+                if progress is not None:
+                    progress(stop / n, f'Neighbour graph: {stop:,} of {n:,} rows')
+
+            for array in (indices, distances, k_distances):
+                array.flush()
+            del indices, distances, k_distances
+            np.save(path('max_eps'), np.float64(max_eps))
+            publish_directory(tmp_dir, directory, 'max_eps.npy')
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return cls(directory)
+
+    def k_distance_curve(self, k=K_DISTANCE_NEIGHBORS):
+        """Sorted distances to the k-th neighbour (the point itself counts as the first)."""
+        return np.sort(self.k_distances[:, k - 1])
+
+    def suggest_eps(self, k=K_DISTANCE_NEIGHBORS):
+        curve = self.k_distance_curve(k)
+        return float(curve[find_elbow(curve)])
+
+    def _neighbourhoods(self, eps):
+        """Edges within ``eps`` and neighbourhood sizes, kept for the last eps used."""
+        state = self._last_eps
+        if state is None or state[0] != eps:
+            within = np.asarray(self.distances) <= eps
+            state = self._last_eps = (eps, within, np.add.reduceat(within, self.indptr[:-1]))
+        return state[1], state[2]
+
+    def labels(self, eps, min_samples):
+        """DBSCAN labels (-1 for noise) for ``eps <= max_eps``.
+
+        Core points have at least ``min_samples`` points (themselves included)
+        within ``eps``; clusters are the connected components of core points.
+        A border point joins the lowest-numbered cluster among its core
+        neighbours, which gives the same labels as scikit-learn's ``DBSCAN``.
+        """
+        if eps > self.max_eps:
+            raise ValueError(f'eps={eps} is larger than the graph radius {self.max_eps}')
+
+        within, degree = self._neighbourhoods(eps)
+        core = degree >= min_samples
+        indices = np.asarray(self.indices)
+
+        core_edge = within & core[indices]
+        row_is_core = np.repeat(core, self._row_lengths)
+        keep = core_edge & row_is_core
+        kept_per_row = np.add.reduceat(keep, self.indptr[:-1])
+        n_kept = int(kept_per_row.sum())
+        # float64 data and matching index dtypes: anything else makes scipy copy
+        # and re-sort the whole graph before the components pass
+        index_dtype = np.int32 if n_kept < np.iinfo(np.int32).max else np.int64
+        adjacency = csr_matrix(
+            (np.ones(n_kept), indices[keep].astype(index_dtype, copy=False),
+             np.concatenate([[0], np.cumsum(kept_per_row)]).astype(index_dtype)),
+            shape=(self.n, self.n)
+        )
+        # The graph is symmetric, so strong components are the clusters and no transpose is needed
+        _, components = connected_components(adjacency, directed=True, connection='strong')
+
+        labels = np.full(self.n, -1, dtype=np.int64)
+        core_points = np.flatnonzero(core)
+        if len(core_points) == 0:
+            return labels
+        # Number clusters in order of their first core point, like scikit-learn
+        _, first, codes = np.unique(components[core_points], return_index=True, return_inverse=True)
+        rank = np.empty(len(first), dtype=np.int64)
+        rank[np.argsort(first)] = np.arange(len(first))
+        labels[core_points] = rank[codes]
+
+        # scikit-learn expands clusters in label order and never relabels a
+        # border point, so it ends up in the lowest-numbered adjacent cluster
+        border_edges = np.flatnonzero(core_edge & ~row_is_core)
+        rows = np.searchsorted(self.indptr, border_edges, side='right') - 1
+        border, first_edge = np.unique(rows, return_index=True)
+        if len(border):
+            labels[border] = np.minimum.reduceat(labels[indices[border_edges]], first_edge)
+        return labels
+
+    def sweep(self, eps_values, min_samples_values, progress=None):
+        """Number of clusters and noise points for every (eps, min_samples).
+
+        Neighbourhoods are computed once per eps and shared by every min_samples.
+        """
+        rows = []
+        grid = [(eps, m) for eps in eps_values for m in min_samples_values]
+        for step, (eps, min_samples) in enumerate(grid):
+            labels = self.labels(eps, min_samples)
+            rows.append({
+                'eps': eps,
+                'min_samples': min_samples,
+                'clusters': int(labels.max()) + 1,
+                'noise': int((labels == -1).sum()),
+                'largest_cluster': int(np.bincount(labels[labels >= 0]).max()) if (labels >= 0).any() else 0,
+            })
+            if progress is not None:
+                progress((step + 1) / len(grid), f'eps={eps:g}, min_samples={min_samples}')
+        return pd.DataFrame(rows)
+
+
+def graph_directory(feature_set, max_eps, data_version):
+    return os.path.join(GRAPHS_DIR, make_key('neighbour_graph', feature_set, max_eps, data_version))
+
+
+def open_graph(load_features, feature_set, data_version, max_eps=None, progress=None):
+    """Neighbour graph of a feature set, built on first use and reused afterwards.
+
+    ``load_features()`` returns the feature matrix; it is only called when
+    the graph has to be built.
+    """
+    max_eps = MAX_EPS[feature_set] if max_eps is None else max_eps
+    directory = graph_directory(feature_set, max_eps, data_version)
+    if os.path.exists(os.path.join(directory, 'max_eps.npy')):
+        return NeighbourGraph(directory)
+    if progress is not None:
+        progress(0.0, 'Building the neighbour graph')
+    return NeighbourGraph.build(load_features(), max_eps, directory, progress=progress)
@@ -0,0 +1,121 @@
+"""2D layouts of the customers for an overview of the merged clusters.
+
+Two layouts of the standardised customer features are available:
+
+- ``PCALayout``: the first two principal components. It is computed in a
+  fraction of a second and places new customers exactly.
+- ``TSNELayout``: the notebook's t-SNE (``TSNE(random_state=42)``). It runs
+  on a cluster-stratified sample of landmark customers only. Every other
+  customer, and any newly scored one, is placed at the inverse-distance
+  weighted mean of the positions of its nearest landmarks. That keeps the
+  cost bounded as the data grows, and new customers never need a recompute.
+
+t-SNE layouts are saved under ``.cache/embeddings`` keyed by data version
+and parameters, and are loaded instead of recomputed.
+"""
+import os
+
+import numpy as np
+from sklearn.manifold import TSNE
+from sklearn.neighbors import KDTree
+
+import lod
+from data_store import CACHE_DIR, atomic_save
+
+EMBEDDING_DIR = os.path.join(CACHE_DIR, 'embeddings')
+N_LANDMARKS = 10000
+N_NEIGHBOURS = 10
+
+
+def scaled_features(store, pipeline):
+    """Standardised features of every customer of the store, in the pipeline's order."""
+    return pipeline.transform(np.column_stack([store.column(name) for name in pipeline.feature_names]))
+
+
+class PCALayout:
+    """Projection on the first two principal components."""
+
+    def __init__(self, mean, components):
+        self.mean = mean
+        self.components = components
+
+    @classmethod
+    def fit(cls, Z):
+        mean = Z.mean(axis=0)
+        _, _, vt = np.linalg.svd(Z - mean, full_matrices=False)
+        return cls(mean, vt[:2])
+
+    def place(self, Z):
+        return ((np.asarray(Z, dtype=float) - self.mean) @ self.components.T).astype(np.float32)
+
+
+class TSNELayout:
+    """t-SNE of landmark customers, extended to any customer by nearest landmarks."""
+
+    def __init__(self, landmarks, landmark_features, landmark_coords, coords, n_neighbours=N_NEIGHBOURS):
+        self.landmarks = landmarks  # row positions of the landmarks in the store
+        self.landmark_features = landmark_features
+        self.landmark_coords = landmark_coords
+        self.coords = coords  # positions of every customer of the store
+        self.n_neighbours = n_neighbours
+        self.index = KDTree(landmark_features)
+
+    @classmethod
+    def fit(cls, Z, labels, n_landmarks=N_LANDMARKS, perplexity=30.0, random_state=42, progress=None):
+        """Lay out a stratified sample of ``n_landmarks`` rows and place the others."""
+        landmarks = lod.stratified_sample(labels, n_landmarks, seed=random_state)
+        if progress is not None:
+            progress(0.0, f't-SNE of {len(landmarks):,} landmark customers')
+        landmark_coords = TSNE(
+            perplexity=min(perplexity, (len(landmarks) - 1) / 3), random_state=random_state
+        ).fit_transform(Z[landmarks])
+
+        layout = cls(landmarks, Z[landmarks].astype(np.float32), landmark_coords.astype(np.float32), None)
+        if progress is not None:
+            progress(0.9, f'Placing the other {len(Z) - len(landmarks):,} customers')
+        coords = layout.place(Z)
+        coords[landmarks] = layout.landmark_coords  # landmarks keep their own positions
+        layout.coords = coords
+        return layout
+
+    def place(self, Z):
+        """Positions of new rows: inverse-distance weighted mean of their nearest landmarks."""
+        distances, neighbours = self.index.query(np.asarray(Z, dtype=np.float32), k=self.n_neighbours)
+        weights = 1.0 / np.maximum(distances, 1e-9)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return np.einsum('ij,ijk->ik', weights, self.landmark_coords[neighbours]).astype(np.float32)
+
+    def save(self, path):
+        """Write the layout to an ``.npz`` file (atomically, layouts may be computed concurrently)."""
+        return atomic_save(path, lambda f: np.savez(
+            f,
+            landmarks=self.landmarks,
+            landmark_features=self.landmark_features,
+            landmark_coords=self.landmark_coords,
+            coords=self.coords,
+            n_neighbours=self.n_neighbours
+        ))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['landmarks'], data['landmark_features'], data['landmark_coords'], data['coords'],
+                n_neighbours=int(data['n_neighbours'])
+            )
+
+
+def tsne_path(version, n_landmarks=N_LANDMARKS, perplexity=30.0, random_state=42):
+    return os.path.join(EMBEDDING_DIR, f'tsne_{version}_{n_landmarks}_{perplexity:g}_{random_state}.npz')
+
+
+def trained_tsne(store, pipeline, labels_column='merged_labels', n_landmarks=N_LANDMARKS, progress=None):
+    """t-SNE layout of the customers of a store version, loaded from disk when computed before."""
+    path = tsne_path(store.version, n_landmarks)
+    if os.path.exists(path):
+        return TSNELayout.load(path)
+    layout = TSNELayout.fit(
+        scaled_features(store, pipeline), store.column(labels_column), n_landmarks=n_landmarks, progress=progress
+    )
+    layout.save(path)
+    return layout
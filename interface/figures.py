@@ -0,0 +1,205 @@
+"""Compact, cacheable payloads of the customer scatters.
+
+The scatter is built from its parts instead of ``px.scatter_3d`` on a data
+frame. The plotted rows of a selection are split by cluster once, and each
+plotted column is stored as float32 arrays per cluster. Plotly serializes
+those as base64 typed arrays, which are half the size of float64 and much
+smaller than JSON number lists. Every cluster is one trace, whether points
+are coloured by cluster or by a continuous column, so changing the colour or
+a single axis only changes that property of the traces; the other arrays
+are reused as they are.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+import lod
+import sorted_index
+
+CLUSTER_COLORS = ['#E41A1C', '#4DAF4A', '#377EB8']
+CONTINUOUS_SCALE = 'Cividis'
+TITLES = {'merged_labels': 'Cluster', 'customer_age': 'Customer Age'}
+
+
+def title(column):
+    return TITLES.get(column, column.replace('_', ' ').title())
+
+
+def cluster_color(cluster):
+    """Colour of a cluster, the same whichever clusters a selection contains."""
+    return CLUSTER_COLORS[int(cluster) % len(CLUSTER_COLORS)]
+
+
+def compact(values):
+    """Contiguous float32 copy of ``values``, serialized by Plotly as a typed array."""
+    return np.ascontiguousarray(values, dtype=np.float32)
+
+
+class ClusterSplit:
+    """Positions of the points of every cluster, in cluster order."""
+
+    def __init__(self, labels):
+        labels = np.asarray(labels)
+        order = np.argsort(labels, kind='stable')
+        self.clusters, starts = np.unique(labels[order], return_index=True)
+        self.positions = np.split(order, starts[1:])
+
+    def __len__(self):
+        return sum(len(p) for p in self.positions)
+
+    def split(self, values):
+        """Compact arrays of ``values`` (one per point) for every cluster."""
+        values = np.asarray(values)
+        return [compact(values[p]) for p in self.positions]
+
+
+def select_rows(store, indexes, ranges, zoom, point_budget, lod_mode):
+    """Rows of the customers to plot, the number of customers selected and the filtered rows.
+
+    ``ranges`` filter the customers (all their rows are returned last) and
+    ``zoom`` (``column -> (lo, hi)``) restricts them to a sub-volume.
+    Selections above the budget are reduced to a cluster-stratified sample,
+    unless they are to be aggregated into voxels, which needs all their rows.
+    """
+    filtered = sorted_index.select_rows(indexes, ranges)
+    if filtered is None:  # no ranges, every customer
+        filtered = np.arange(store.n_rows)
+    rows = filtered
+    if zoom:
+        rows = rows[lod.within_bounds([store.column(c)[rows] for c in zoom], list(zoom.values()))]
+    n_selected = len(rows)
+    if n_selected > point_budget and lod_mode == 'sample':
+        # Stratify by cluster so that small clusters remain visible
+        rows = rows[lod.stratified_sample(store.column('merged_labels')[rows], point_budget)]
+    return rows, n_selected, filtered
+
+
+def voxel_columns(store, rows, axes, color_by, resolution):
+    """Voxels of the selected rows, split by cluster.
+
+    Returns the ``ClusterSplit`` of the voxels and a dict of their columns:
+    the axes, ``color_by`` (mean value, for continuous colours), the number
+    of ``Customers`` and the marker size (``density``).
+    """
+    continuous = color_by != 'merged_labels'
+    voxels = lod.voxel_aggregate(
+        np.column_stack([store.column(axis)[rows] for axis in axes]),
+        store.column('merged_labels')[rows],
+        resolution=resolution,
+        values=store.column(color_by)[rows] if continuous else None
+    )
+    split = ClusterSplit(voxels['labels'])
+    columns = {axis: split.split(voxels['centers'][:, i]) for i, axis in enumerate(axes)}
+    if continuous:
+        columns[color_by] = split.split(voxels['values'])
+    columns['Customers'] = split.split(voxels['counts'])
+    columns['density'] = split.split(lod.density_sizes(voxels['counts']))
+    return split, columns
+
+
+def scatter_3d(clusters, coords, axes, color=None, color_by='merged_labels', sizes=None, customers=None,
+               uirevision=None):
+    """The 3D scatter, with one trace per cluster.
+
+    ``coords`` holds the per-cluster arrays of every axis, and ``color``,
+    ``sizes`` and ``customers`` optional per-cluster arrays of a continuous
+    colour, marker sizes and voxel counts. Without ``sizes`` markers have the
+    fixed size of single customers.
+    """
+    hover = [f'{title(axis)}=%{{{name}}}' for axis, name in zip(axes, 'xyz')]
+    if color is not None:
+        hover.append(f'{title(color_by)}=%{{marker.color}}')
+    if customers is not None:
+        hover.append('Customers=%{customdata}')
+
+    fig = go.Figure()
+    for i, cluster in enumerate(clusters):
+        marker = dict(
+            size=sizes[i] if sizes is not None else 3,
+            opacity=0.8,
+            line=dict(width=0.05, color='rgba(255, 255, 255, 0.3)')
+        )
+        if color is None:
+            marker['color'] = cluster_color(cluster)
+        else:
+            marker.update(color=color[i], coloraxis='coloraxis')
+        fig.add_trace(go.Scatter3d(
+            x=coords[0][i],
+            y=coords[1][i],
+            z=coords[2][i],
+            mode='markers',
+            name=str(cluster),
+            legendgroup=str(cluster),
+            marker=marker,
+            customdata=customers[i] if customers is not None else None,
+            hovertemplate='<br>'.join(hover) + f'<extra>Cluster {cluster}</extra>'
+        ))
+
+    fig.update_layout(
+        title='Customer Distribution in 3D Space',
+        legend_title_text='Cluster',
+        scene=dict(
+            xaxis_title=title(axes[0]),
+            yaxis_title=title(axes[1]),
+            zaxis_title=title(axes[2]),
+            bgcolor='rgb(30, 30, 30)'  # Ensure background remains dark
+        ),
+        paper_bgcolor='rgb(30, 30, 30)',  # Set the overall paper background to dark
+        margin=dict(l=0, r=0, b=0, t=30),
+        scene_camera=dict(
+            up=dict(x=0, y=0, z=1),
+            center=dict(x=0, y=0, z=0),
+            eye=dict(x=1.5, y=1.5, z=1.5)
+        ),
+        # Camera and legend state survive reruns that keep the same revision
+        uirevision=uirevision,
+        scene_uirevision=uirevision
+    )
+    if color is not None:
+        fig.update_layout(coloraxis=dict(colorscale=CONTINUOUS_SCALE, colorbar=dict(title=title(color_by))))
+    return fig
+
+
+def scatter_2d(clusters, coords, layout_title, new_coords=None, new_labels=None, uirevision=None):
+    """2D map of the customers, with one WebGL trace per cluster.
+
+    ``new_coords`` and ``new_labels`` add newly scored customers on top,
+    drawn as crosses in the colour of their cluster.
+    """
+    fig = go.Figure()
+    for i, cluster in enumerate(clusters):
+        fig.add_trace(go.Scattergl(
+            x=coords[0][i],
+            y=coords[1][i],
+            mode='markers',
+            name=str(cluster),
+            legendgroup=str(cluster),
+            marker=dict(size=3, opacity=0.6, color=cluster_color(cluster)),
+            hoverinfo='skip'
+        ))
+    if new_coords is not None:
+        fig.add_trace(go.Scattergl(
+            x=compact(new_coords[:, 0]),
+            y=compact(new_coords[:, 1]),
+            mode='markers',
+            name='New customers',
+            marker=dict(
+                size=9,
+                symbol='x',
+                color=[cluster_color(label) for label in new_labels],
+                line=dict(width=1, color='white')
+            ),
+            customdata=np.asarray(new_labels),
+            hovertemplate='New customer<extra>Cluster %{customdata}</extra>'
+        ))
+
+    fig.update_layout(
+        title=f'Customers on the {layout_title} Layout',
+        legend_title_text='Cluster',
+        xaxis=dict(showticklabels=False, title=None),
+        yaxis=dict(showticklabels=False, title=None, scaleanchor='x'),
+        plot_bgcolor='rgb(30, 30, 30)',
+        paper_bgcolor='rgb(30, 30, 30)',
+        margin=dict(l=0, r=0, b=0, t=30),
+        uirevision=uirevision
+    )
+    return fig
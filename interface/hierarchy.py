@@ -0,0 +1,190 @@
+"""Hierarchical clustering of large datasets through weighted micro-clusters.
+
+A ward tree over every customer needs the O(n²) distance matrix. Instead the
+data is first compressed into a few thousand micro-clusters: mini-batch
+K-means streams over blocks of rows to place the centres, and a second pass
+over the blocks assigns every row to its nearest centre and accumulates the
+exact size and mean of each micro-cluster. The ward tree is then built on
+the micro-clusters, weighted by their sizes, and its cuts are mapped back
+to every customer through their micro-cluster.
+
+The ward merge cost only depends on the sizes and means of the two groups
+merged, so every merge above the micro-cluster level has exactly the height
+it has in the full tree restricted to those groups. The linkage matrix has
+scipy's layout with the micro-clusters as leaves, so ``dendrogram`` and
+``cut_tree`` work on it unchanged; the number of customers under each merge
+is kept alongside.
+"""
+import numpy as np
+from scipy.cluster.hierarchy import cut_tree, linkage
+from sklearn.cluster import MiniBatchKMeans
+
+N_MICRO = 2000
+
+
+def _blocks(n, block_size):
+    return [slice(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+
+
+def _nearest(X, centres, centres_sq):
+    return (centres_sq - 2 * X @ centres.T).argmin(axis=1)
+
+
+class MicroClusters:
+    """Sizes and means of micro-clusters and the micro-cluster of every row."""
+
+    def __init__(self, centres, weights, assignments):
+        self.centres = centres
+        self.weights = weights
+        self.assignments = assignments
+
+    def __len__(self):
+        return len(self.weights)
+
+    @classmethod
+    def fit(cls, X, n_micro=N_MICRO, block_size=4096, random_state=42, progress=None):
+        """Compress the rows of ``X`` (an array or memmap read by blocks) into micro-clusters."""
+        n = len(X)
+        n_micro = min(n_micro, n)
+        # The first partial_fit needs at least one row per centre
+        blocks = _blocks(n, max(block_size, n_micro))
+        model = MiniBatchKMeans(
+            n_clusters=n_micro, batch_size=block_size, random_state=random_state, n_init=1
+        )
+        for step, block in enumerate(blocks, start=1):
+            model.partial_fit(np.asarray(X[block], dtype=float))
+            if progress is not None:
+                progress(0.5 * step / len(blocks), f'Placing micro-clusters ({step}/{len(blocks)})')
+
+        # Exact pass: the sizes and means of the final assignment
+        centres = model.cluster_centers_
+        centres_sq = (centres ** 2).sum(axis=1)
+        assignments = np.empty(n, dtype=np.int32)
+        sums = np.zeros_like(centres)
+        for step, block in enumerate(blocks, start=1):
+            values = np.asarray(X[block], dtype=float)
+            codes = _nearest(values, centres, centres_sq)
+            assignments[block] = codes
+            sums += np.column_stack([np.bincount(codes, values[:, j], n_micro) for j in range(values.shape[1])])
+            if progress is not None:
+                progress(0.5 + 0.5 * step / len(blocks), f'Assigning rows ({step}/{len(blocks)})')
+        weights = np.bincount(assignments, minlength=n_micro).astype(float)
+
+        # Centres left without rows are dropped and the codes renumbered
+        used = weights > 0
+        renumber = np.cumsum(used) - 1
+        return cls(sums[used] / weights[used, None], weights[used], renumber[assignments].astype(np.int32))
+
+
+def _subtree_weights(Z, weights):
+    """Total weight under every merge of a linkage matrix."""
+    n = len(weights)
+    totals = np.concatenate([weights, np.zeros(n - 1)])
+    for step, (a, b) in enumerate(Z[:, :2].astype(int)):
+        totals[n + step] = totals[a] + totals[b]
+    return totals[n:]
+
+
+def _label_merges(merges, weights):
+    """scipy linkage from merges of leaf representatives in any order (union-find relabelling)."""
+    n = len(weights)
+    order = np.argsort([m[2] for m in merges], kind='stable')
+    parent = np.arange(n)
+    cluster_of = np.arange(n)  # cluster id currently holding each representative
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # The fourth column counts leaves, which is what scipy validates
+    Z = np.empty((n - 1, 4))
+    for step, position in enumerate(order):
+        a, b, distance = merges[position]
+        ra, rb = root(a), root(b)
+        Z[step, :3] = *sorted((cluster_of[ra], cluster_of[rb])), distance
+        parent[rb] = ra
+        cluster_of[ra] = n + step
+    Z[:, 3] = _subtree_weights(Z, np.ones(n))
+    return Z
+
+
+def weighted_ward(centres, weights):
+    """Ward linkage of weighted points, as a scipy linkage matrix.
+
+    Uses the nearest-neighbour chain algorithm with the ward distance
+    ``sqrt(2 w_a w_b / (w_a + w_b)) |c_a - c_b|`` (scipy's convention), which
+    only needs the centres and weights of the active clusters: memory is
+    linear in the number of points. With unit weights the result is the same
+    tree as ``linkage(centres, 'ward')``.
+    """
+    centres = np.array(centres, dtype=float)
+    leaf_weights = np.asarray(weights, dtype=float)
+    weights = leaf_weights.copy()
+    n = len(weights)
+    active = np.ones(n, dtype=bool)
+    merges = []
+    chain = []
+
+    def distances_from(i):
+        d = 2 * weights[i] * weights / (weights[i] + weights) * ((centres - centres[i]) ** 2).sum(axis=1)
+        d[~active] = np.inf
+        d[i] = np.inf
+        return d
+
+    while len(merges) < n - 1:
+        if not chain:
+            chain.append(int(np.flatnonzero(active)[0]))
+        a = chain[-1]
+        d = distances_from(a)
+        b = int(d.argmin())
+        # Prefer the previous chain element on ties, so the chain always ends
+        if len(chain) > 1 and d[chain[-2]] <= d[b]:
+            b = chain[-2]
+        if len(chain) > 1 and b == chain[-2]:
+            chain.pop()
+            chain.pop()
+            total = weights[a] + weights[b]
+            merges.append((a, b, float(np.sqrt(d[b]))))
+            # The merged cluster lives on in slot b
+            centres[b] = (weights[a] * centres[a] + weights[b] * centres[b]) / total
+            weights[b] = total
+            active[a] = False
+        else:
+            chain.append(b)
+    return _label_merges(merges, leaf_weights)
+
+
+class Hierarchy:
+    """Ward (or other linkage) tree over micro-clusters, with labels for every row."""
+
+    def __init__(self, micro, Z):
+        self.micro = micro
+        self.Z = Z
+        self.sizes = _subtree_weights(Z, micro.weights)  # customers under every merge
+
+    @classmethod
+    def fit(cls, X, method='ward', n_micro=N_MICRO, random_state=42, progress=None):
+        micro = MicroClusters.fit(X, n_micro=n_micro, random_state=random_state, progress=progress)
+        if method == 'ward':
+            Z = weighted_ward(micro.centres, micro.weights)
+        else:
+            # Other linkages have no weighted form in scipy; they use the micro-cluster centres
+            Z = linkage(micro.centres, method=method, metric='euclidean')
+        return cls(micro, Z)
+
+    def labels(self, ks):
+        """Labels of every row for every number of clusters in ``ks``."""
+        cuts = cut_tree(self.Z, n_clusters=list(ks))
+        return {k: cuts[self.micro.assignments, position] for position, k in enumerate(ks)}
+
+    def cut_height(self, k):
+        """A height at which cutting the tree leaves ``k`` clusters."""
+        heights = self.Z[:, 2]
+        if k <= 1:
+            return heights[-1]
+        if k > len(heights):
+            return 0.0
+        return (heights[-k] + heights[-k + 1]) / 2
+
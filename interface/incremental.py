@@ -0,0 +1,212 @@
+"""Incremental refresh of the segment models as new customer batches arrive.
+
+Starting from the scoring pipeline and the labelled history, every batch
+moves each segment centroid to the running mean of all the customers assigned
+to it (the per-centre learning rate 1/count of mini-batch K-means), and adds
+the batch to the per merged cluster counts, sums and sums of squares. The
+cost of an update is proportional to the batch, not to the history.
+
+Each update returns drift metrics: how far every centroid moved and how many
+labels changed, both for the batch itself and for a fixed reference sample
+of the history.
+
+Usage::
+
+    python interface/incremental.py week_41.csv week_42.parquet
+"""
+import argparse
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+import scoring
+from data_store import CACHE_DIR, atomic_save
+
+MODEL_FILE = os.path.join(CACHE_DIR, 'incremental_model.npz')
+DRIFT_LOG = os.path.join(CACHE_DIR, 'drift_history.jsonl')
+
+SEGMENT_NAMES = list(scoring.SEGMENTS)
+
+
+class BatchReport:
+    """Drift metrics of one incremental update."""
+
+    def __init__(self, rows, seconds, centroid_shift, batch_churn, reference_churn, merged_sizes):
+        self.rows = rows
+        self.seconds = seconds
+        self.centroid_shift = centroid_shift  # segment -> distance moved by each centroid
+        self.batch_churn = batch_churn  # label -> share of the batch relabelled by the update
+        self.reference_churn = reference_churn  # label -> share of the reference sample relabelled
+        self.merged_sizes = merged_sizes
+
+    def as_dict(self):
+        return {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'rows': self.rows,
+            'seconds': round(self.seconds, 4),
+            'centroid_shift': {k: v.round(6).tolist() for k, v in self.centroid_shift.items()},
+            'max_centroid_shift': {k: float(v.max()) for k, v in self.centroid_shift.items()},
+            'batch_churn': self.batch_churn,
+            'reference_churn': self.reference_churn,
+            'merged_sizes': self.merged_sizes.tolist(),
+        }
+
+    def __repr__(self):
+        shift = ', '.join(f'{k}={v.max():.4f}' for k, v in self.centroid_shift.items())
+        churn = ', '.join(f'{k}={v:.2%}' for k, v in self.reference_churn.items())
+        return f'BatchReport(rows={self.rows}, max shift: {shift}; reference churn: {churn})'
+
+
+class IncrementalModel:
+    """Segment centroids with their counts and the merged cluster statistics."""
+
+    def __init__(self, pipeline, segment_counts, merged_counts, merged_sums, merged_sumsq, reference):
+        self.pipeline = pipeline
+        self.segment_counts = {k: np.asarray(v, dtype=float) for k, v in segment_counts.items()}
+        self.merged_counts = np.asarray(merged_counts, dtype=float)
+        self.merged_sums = np.asarray(merged_sums, dtype=float)
+        self.merged_sumsq = np.asarray(merged_sumsq, dtype=float)
+        self.reference = np.asarray(reference, dtype=float)  # scaled rows used to measure churn
+
+    @classmethod
+    def from_history(cls, pipeline=None, labelled_path=scoring.LABELLED_FILE, reference_size=5000, random_state=42):
+        """Seed the model from the exported scaler and labelled customers."""
+        pipeline = pipeline or scoring.build_pipeline()
+        with open(labelled_path, 'rb') as f:
+            labelled = pickle.load(f)
+
+        Z = labelled[pipeline.feature_names].to_numpy(dtype=float)
+        labels = pipeline.score_array(Z, scaled=True)
+        segment_counts = {
+            segment: np.bincount(labels[segment], minlength=len(pipeline.segments[segment][1]))
+            for segment in SEGMENT_NAMES
+        }
+
+        n_merged = int(pipeline.lookup.max()) + 1
+        X = Z * pipeline.scale + pipeline.mean  # statistics are kept in the original units
+        merged = labels[scoring.MERGED_LABEL]
+        merged_counts = np.bincount(merged, minlength=n_merged)
+        merged_sums = np.column_stack([np.bincount(merged, X[:, j], n_merged) for j in range(X.shape[1])])
+        merged_sumsq = np.column_stack([np.bincount(merged, X[:, j] ** 2, n_merged) for j in range(X.shape[1])])
+
+        rng = np.random.default_rng(random_state)
+        reference = Z[rng.choice(len(Z), size=min(reference_size, len(Z)), replace=False)]
+        return cls(pipeline, segment_counts, merged_counts, merged_sums, merged_sumsq, reference)
+
+    @property
+    def merged_means(self):
+        return self.merged_sums / self.merged_counts[:, None]
+
+    @property
+    def merged_variances(self):
+        return self.merged_sumsq / self.merged_counts[:, None] - self.merged_means ** 2
+
+    def partial_fit(self, df, scaled=False):
+        """Update the model with a batch of customers and report the drift."""
+        start = time.perf_counter()
+        pipeline = self.pipeline
+        X = df[pipeline.feature_names].to_numpy(dtype=float)
+        Z = X if scaled else pipeline.transform(X)
+        if scaled:
+            X = Z * pipeline.scale + pipeline.mean
+
+        before = pipeline.score_array(Z, scaled=True)
+        reference_before = pipeline.score_array(self.reference, scaled=True)
+
+        shift = {}
+        for segment in SEGMENT_NAMES:
+            columns, centroids = pipeline.segments[segment]
+            labels = before[segment]
+            k = len(centroids)
+            batch_counts = np.bincount(labels, minlength=k)
+            batch_sums = np.column_stack([np.bincount(labels, Z[:, c], k) for c in columns])
+
+            counts = self.segment_counts[segment] + batch_counts
+            updated = centroids.copy()
+            moved = batch_counts > 0
+            # Running mean: c + (sum_batch - m * c) / (n + m)
+            updated[moved] += (batch_sums[moved] - batch_counts[moved, None] * centroids[moved]) / counts[moved, None]
+
+            shift[segment] = np.sqrt(((updated - centroids) ** 2).sum(axis=1))
+            pipeline.segments[segment] = (columns, updated)
+            self.segment_counts[segment] = counts
+
+        after = pipeline.score_array(Z, scaled=True)
+        reference_after = pipeline.score_array(self.reference, scaled=True)
+
+        merged = after[scoring.MERGED_LABEL]
+        n_merged = len(self.merged_counts)
+        self.merged_counts += np.bincount(merged, minlength=n_merged)
+        self.merged_sums += np.column_stack([np.bincount(merged, X[:, j], n_merged) for j in range(X.shape[1])])
+        self.merged_sumsq += np.column_stack([np.bincount(merged, X[:, j] ** 2, n_merged) for j in range(X.shape[1])])
+
+        return BatchReport(
+            rows=len(Z),
+            seconds=time.perf_counter() - start,
+            centroid_shift=shift,
+            batch_churn={name: float((before[name] != after[name]).mean()) for name in before},
+            reference_churn={name: float((reference_before[name] != reference_after[name]).mean()) for name in before},
+            merged_sizes=self.merged_counts.astype(np.int64),
+        )
+
+    def update_file(self, path, chunk_size=100000, log_path=DRIFT_LOG):
+        """Apply every chunk of a CSV or Parquet file as a batch, logging the reports."""
+        reports = []
+        for chunk in scoring.read_chunks(path, chunk_size):
+            report = self.partial_fit(chunk)
+            reports.append(report)
+            if log_path is not None:
+                os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+                with open(log_path, 'a') as f:
+                    f.write(json.dumps(dict(report.as_dict(), source=os.path.basename(path))) + '\n')
+        return reports
+
+    def save(self, path=MODEL_FILE):
+        """Persist the model; the refreshed centroids are also saved as the scoring pipeline.
+
+        Both files are replaced atomically, as the app may be reading them.
+        """
+        self.pipeline.save(scoring.PIPELINE_FILE)
+        return atomic_save(path, lambda f: np.savez(
+            f,
+            merged_counts=self.merged_counts,
+            merged_sums=self.merged_sums,
+            merged_sumsq=self.merged_sumsq,
+            reference=self.reference,
+            **{f'counts__{segment}': counts for segment, counts in self.segment_counts.items()}
+        ))
+
+    @classmethod
+    def load(cls, path=MODEL_FILE):
+        """Load the persisted model, seeding it from the history on first use."""
+        if not os.path.exists(path):
+            return cls.from_history()
+        pipeline = scoring.load_pipeline()
+        with np.load(path) as data:
+            segment_counts = {name.split('__', 1)[1]: data[name] for name in data.files if name.startswith('counts__')}
+            return cls(
+                pipeline, segment_counts, data['merged_counts'], data['merged_sums'], data['merged_sumsq'],
+                data['reference']
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update the cluster models with new customer batches.')
+    parser.add_argument('inputs', nargs='+', help='CSV or Parquet files with unscaled customer features')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--reset', action='store_true', help='start again from the labelled history')
+    args = parser.parse_args()
+
+    model = IncrementalModel.from_history() if args.reset else IncrementalModel.load()
+    for path in args.inputs:
+        for report in model.update_file(path, chunk_size=args.chunk_size):
+            print(path, report)
+    model.save()
+    print('Merged cluster sizes:', model.merged_counts.astype(int).tolist())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,43 +1,606 @@
 import streamlit as st
+import collections
 import os
+import numpy as np
 import pandas as pd
-import pickle
 import plotly.express as px
+import plotly.graph_objects as go
+from scipy.cluster.hierarchy import dendrogram
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import assets
+import clustering
+import cube
+import data_store
+import density
+import embedding
+import figures
+import jobs
+import result_cache
+import scoring
+import sorted_index
+import tracing
+
+CUSTOMER_DATA = 'customer_id_merged_unscaled.pkl'
+PERFORMANCE_HISTORY = 20
+
+
+@st.cache_resource(max_entries=4)
+def load_customer_store(path, signature):
+    """Open the memory-mapped copy of a data file once per process.
+
+    The source signature is part of the cache key, so editing the pickle
+    transparently reopens (and if needed rebuilds) the store.
+    """
+    return data_store.open_store(path)
+
+
+@st.cache_resource(max_entries=1)
+def load_sorted_indexes(_store, version, columns):
+    """Sort-order indexes of the filterable columns for one store version."""
+    return {column: sorted_index.SortedColumnIndex(_store, column) for column in columns}
+
+
+@st.cache_resource
+def load_plot_manifest():
+    """Scan the plots tree once per process and start building the image variants."""
+    manifest = assets.AssetManifest()
+    manifest.warm()
+    return manifest
+
+
+@st.cache_resource(max_entries=1)
+def load_aggregate_cube(_store, version, features):
+    """Per-(labels, age) cell aggregates of the features for profiles of age ranges."""
+    return cube.AggregateCube(_store, features)
+
+
+@st.cache_resource(max_entries=8)
+def load_plotted_rows(_store, _indexes, version, ranges, zoom, point_budget, lod_mode):
+    """Rows of a selection sent to the 3D scatter, split by cluster, the number selected and the filtered rows."""
+    rows, n_selected, filtered = figures.select_rows(
+        _store, _indexes, dict(ranges), dict(zoom), point_budget, lod_mode
+    )
+    return rows, figures.ClusterSplit(_store.column('merged_labels')[rows]), n_selected, filtered
+
+
+@st.cache_resource(max_entries=32)
+def load_plotted_column(_store, _rows, _split, selection, column):
+    """Float32 values of one column of the plotted rows, one array per cluster."""
+    return _split.split(_store.column(column)[_rows])
+
+
+@st.cache_resource(max_entries=8)
+def load_voxel_columns(_store, _rows, selection, axes, color_by, resolution):
+    """Voxel aggregates of a selection for one set of axes and colour."""
+    return figures.voxel_columns(_store, _rows, list(axes), color_by, resolution)
+
+
+@st.cache_resource(max_entries=8)
+def load_scatter_figure(_store, _rows, _split, selection, axes, color_by, resolution):
+    """The 3D scatter of a selection (of voxels when a resolution is given) and its number of points.
+
+    Columns come from their own caches, so the figure for a new colour or
+    axis only reads and converts the column that changed.
+    """
+    version = selection[0]
+    if resolution is not None:
+        split, columns = load_voxel_columns(_store, _rows, selection, axes, color_by, resolution)
+        fig = figures.scatter_3d(
+            split.clusters, [columns[axis] for axis in axes], axes,
+            color=columns.get(color_by), color_by=color_by,
+            sizes=columns['density'], customers=columns['Customers'], uirevision=version
+        )
+        return fig, len(split)
+    coords = [load_plotted_column(_store, _rows, _split, selection, axis) for axis in axes]
+    color = load_plotted_column(_store, _rows, _split, selection, color_by) if color_by != 'merged_labels' else None
+    return figures.scatter_3d(_split.clusters, coords, axes, color=color, color_by=color_by, uirevision=version), len(_split)
+
+
+def show_plot(key):
+    """Display a plot from the manifest at the quality chosen in the sidebar."""
+    manifest = load_plot_manifest()
+    with trace.span(f'image {key}'):
+        data = manifest.original(key) if plot_quality == 'original' else manifest.variant(key, plot_quality)
+        st.image(data)
+    trace.add('image_bytes', len(data))
+    trace.add('images', 1)
+
+
+@st.cache_resource
+def load_trace_sink():
+    """JSONL file receiving the trace of every rerun of every session."""
+    return tracing.TraceSink()
+
+
+def plotly_chart(fig, **kwargs):
+    """``st.plotly_chart`` timed in the rerun trace.
+
+    The serialized size of the figure is only measured while the
+    performance panel is open, as it costs a second serialization.
+    """
+    with trace.span('plotly_chart'):
+        if show_performance:
+            trace.add('plotly_json_bytes', len(fig.to_json()))
+        st.plotly_chart(fig, **kwargs)
+    trace.add('plotly_charts', 1)
+
+
+def start_trace(page):
+    """Trace of this rerun; a previous rerun interrupted by st.rerun or st.stop is closed first."""
+    state = st.session_state
+    if 'rerun_traces' not in state:
+        state['rerun_traces'] = collections.deque(maxlen=PERFORMANCE_HISTORY)
+    traces = state['rerun_traces']
+    if traces and traces[-1].status == 'running':
+        load_trace_sink().write(traces[-1].finish('interrupted'))
+    ctx = get_script_run_ctx()
+    current = tracing.RerunTrace(ctx.session_id if ctx is not None else None, page)
+    traces.append(current)
+    return current
+
+
+def performance_panel(traces):
+    """Sidebar summary of the last reruns of this session."""
+    with st.sidebar.expander("Performance", expanded=True):
+        rows = []
+        for t in reversed(traces):
+            slowest = max((span for span in t.spans if span[3] is not None), key=lambda span: span[3], default=None)
+            rows.append({
+                'page': t.page,
+                'status': t.status,
+                'total (ms)': None if t.seconds is None else round(t.seconds * 1000),
+                'slowest stage': None if slowest is None else f"{slowest[0]} ({slowest[3] * 1000:.0f} ms)",
+                'charts (KB)': round(t.counters.get('plotly_json_bytes', 0) / 1024),
+                'images (KB)': round(t.counters.get('image_bytes', 0) / 1024),
+                'process RSS (MB)': None if t.memory_mb is None else round(t.memory_mb),
+            })
+        st.dataframe(pd.DataFrame(rows), hide_index=True)
+        st.caption("Process RSS is the resident memory of the whole server process, shared by every session.")
+        
+        last = traces[-1]
+        spans = pd.DataFrame(
+            [(('  ' * depth) + name, seconds * 1000) for name, depth, _, seconds in last.spans if seconds is not None],
+            columns=['stage', 'ms']
+        )
+        if len(spans):
+            fig = px.bar(spans, x='ms', y='stage', orientation='h')
+            fig.update_layout(title=f'Last rerun: {last.seconds * 1000:.0f} ms', yaxis=dict(autorange='reversed'), height=120 + 20 * len(spans))
+            st.plotly_chart(fig, use_container_width=True)
+
+
+@st.cache_resource
+def load_job_manager():
+    """Background workers shared by every session of the process."""
+    return jobs.JobManager(max_workers=2)
+
+
+@st.cache_resource
+def load_result_cache():
+    return result_cache.ResultCache()
+
+
+@st.cache_resource(max_entries=2)
+def load_scoring_pipeline(path, signature):
+    """Scaler, centroids and merged-cluster table used to score new customers.
+
+    The file signature is part of the cache key, so centroids refreshed by
+    ``incremental.py`` reach the app without a restart.
+    """
+    return scoring.ScoringPipeline.load(path)
+
+
+def scoring_pipeline():
+    path = scoring.ensure_pipeline()
+    return load_scoring_pipeline(path, data_store.source_signature(path))
+
+
+@st.cache_resource(max_entries=1)
+def load_pca_layout(_store, version):
+    """PCA layout of the customers of a store version, with their coordinates."""
+    Z = embedding.scaled_features(_store, scoring_pipeline())
+    layout = embedding.PCALayout.fit(Z)
+    return layout, layout.place(Z)
+
+
+def plot_cluster_profile(profile, counts):
+    """Cluster means per feature and cluster sizes, like the notebook's cluster_profiles."""
+    cluster_names = [f"Cluster {label}" for label in profile.index]
+    means_col, counts_col = st.columns([2, 1])
+    with means_col:
+        means = profile.set_axis(cluster_names).T
+        fig = px.line(means, markers=True, labels={'index': '', 'value': 'Mean (standardized)', 'variable': ''})
+        fig.add_hline(y=0, line_dash='dash', line_color='black')
+        fig.update_layout(title=f"Cluster Means - {len(profile)} Clusters")
+        plotly_chart(fig, use_container_width=True)
+    with counts_col:
+        fig = px.bar(x=cluster_names, y=counts.values, labels={'x': '', 'y': 'Absolute Frequency'})
+        fig.update_layout(title=f"Cluster Sizes - {len(profile)} Clusters")
+        plotly_chart(fig, use_container_width=True)
+
+
+@st.fragment(run_every=1.0)
+def job_progress(key):
+    """Poll a running job; rerun the page once it has finished."""
+    job = load_job_manager().get(key)
+    if job is None or job.done:
+        st.rerun()
+    st.progress(job.progress, text=f"{job.description}: {job.message} ({job.elapsed:.0f}s)")
+
+
+def request_retry(key):
+    st.session_state.setdefault('job_retries', set()).add(key)
+
+
+def submit_job(key, fn, *args, description='', cache=None):
+    """Submit a background job, running it again if its 'Retry' button was pressed.
+
+    Jobs whose result ``fn`` stores in ``cache`` under ``key`` read it back
+    from there instead of keeping it in memory.
+    """
+    retries = st.session_state.get('job_retries', set())
+    retry = key in retries
+    retries.discard(key)
+    return load_job_manager().submit(key, fn, *args, description=description, cache=cache, retry=retry)
+
+
+def job_error(job, message):
+    """Show why a job failed, with a button to run it again."""
+    st.error(f"{message}: {job.error}")
+    st.button('Retry', key=f'retry_{job.key}', on_click=request_retry, args=(job.key,))
+
+def elbow_chart(feature_set, fallback_plot):
+    """Interactive R² plot per method, computed in the background once per data version."""
+    store = load_customer_store(clustering.DATA_FILE, data_store.source_signature(clustering.DATA_FILE))
+    key = clustering.r2_sweep_key(store, feature_set)
+    job = submit_job(
+        key,
+        clustering.cached_r2_sweep,
+        load_result_cache(), store, feature_set,
+        description=f"R² sweep on {feature_set}",
+        cache=load_result_cache()
+    )
+    
+    if not job.done:
+        # The exported plot is shown until the live sweep is ready
+        show_plot(fallback_plot)
+        job_progress(key)
+    elif job.error is not None:
+        job_error(job, "R² sweep failed")
+        show_plot(fallback_plot)
+    else:
+        fig = px.line(
+            job.result,
+            markers=True,
+            labels={'n_clusters': 'Number of clusters', 'value': 'R² metric', 'variable': 'Cluster methods'}
+        )
+        fig.update_layout(title='R² plot for various clustering methods')
+        plotly_chart(fig, use_container_width=True)
+
+
+def dendrogram_chart(feature_set, fallback_plot, default_k=6):
+    """Ward dendrogram of every customer (through micro-clusters) with a movable cut."""
+    store = load_customer_store(clustering.DATA_FILE, data_store.source_signature(clustering.DATA_FILE))
+    key = clustering.hierarchy_key(store, feature_set)
+    job = submit_job(
+        key,
+        clustering.cached_hierarchy,
+        load_result_cache(), store, feature_set,
+        description=f"Ward tree of {feature_set}",
+        cache=load_result_cache()
+    )
+    
+    if not job.done:
+        show_plot(fallback_plot)
+        job_progress(key)
+        return
+    if job.error is not None:
+        job_error(job, "Hierarchical clustering failed")
+        show_plot(fallback_plot)
+        return
+    
+    tree = job.result
+    n_clusters = st.slider('Number of clusters', 2, 15, default_k, key=f'dendrogram_k_{feature_set}')
+    threshold = tree.cut_height(n_clusters)
+    
+    # Only the top of the tree is drawn; leaves are labelled with their number of customers
+    shape = dendrogram(tree.Z, truncate_mode='lastp', p=40, no_plot=True)
+    n_leaves = len(tree.micro)
+    leaf_sizes = [tree.micro.weights[i] if i < n_leaves else tree.sizes[i - n_leaves] for i in shape['leaves']]
+    x, y = [], []
+    for xs, ys in zip(shape['icoord'], shape['dcoord']):
+        x += xs + [None]
+        y += ys + [None]
+    
+    fig = go.Figure(go.Scatter(x=x, y=y, mode='lines', line=dict(color='black', width=1), hoverinfo='skip'))
+    fig.add_hline(y=threshold, line_dash='dash', line_color='red')
+    fig.update_layout(
+        title=f'Hierarchical Clustering - Ward\'s Dendrogram ({n_clusters} clusters)',
+        xaxis=dict(
+            tickmode='array',
+            tickvals=[5 + 10 * i for i in range(len(leaf_sizes))],
+            ticktext=[f'{int(size):,}' for size in leaf_sizes],
+            title='Number of customers in node'
+        ),
+        yaxis_title='Euclidean Distance',
+        showlegend=False
+    )
+    plotly_chart(fig, use_container_width=True)
+    
+    labels = tree.labels([n_clusters])[n_clusters]
+    st.caption(
+        f"Tree built on {n_leaves:,} micro-clusters summarising {int(tree.sizes[-1]):,} customers. "
+        f"Cluster sizes: {', '.join(f'{count:,}' for count in np.bincount(labels))}"
+    )
+
+
+def silhouette_chart(feature_set, fallback_plot):
+    """Average silhouette per number of clusters and the silhouettes of each cluster.
+
+    Sampled estimates with confidence intervals are shown first; the exact
+    scores are computed on request.
+    """
+    store = load_customer_store(clustering.DATA_FILE, data_store.source_signature(clustering.DATA_FILE))
+    exact = st.toggle('Exact scores (all customers, slower)', key=f'silhouette_exact_{feature_set}')
+    key = clustering.silhouette_sweep_key(store, feature_set, exact)
+    job = submit_job(
+        key,
+        clustering.cached_silhouette_sweep,
+        load_result_cache(), store, feature_set, exact,
+        description=f"{'Exact' if exact else 'Estimated'} silhouette sweep on {feature_set}",
+        cache=load_result_cache()
+    )
+    
+    if not job.done:
+        show_plot(fallback_plot)
+        job_progress(key)
+        return
+    if job.error is not None:
+        job_error(job, "Silhouette analysis failed")
+        show_plot(fallback_plot)
+        return
+    
+    sweep = job.result
+    scores = sweep['scores']
+    fig = px.line(
+        scores,
+        y='score',
+        markers=True,
+        error_y=None if exact else scores['upper'] - scores['score'],
+        error_y_minus=None if exact else scores['score'] - scores['lower'],
+        labels={'n_clusters': 'Number of clusters', 'score': 'Average silhouette'}
+    )
+    title = 'Average silhouette plot over clusters'
+    fig.update_layout(title=title if exact else f'{title} (95% confidence intervals)')
+    plotly_chart(fig, use_container_width=True)
+    
+    k = st.select_slider('Clusters to inspect', options=list(scores.index), value=3, key=f'silhouette_k_{feature_set}')
+    result = sweep['results'][k]
+    summary = result['summary']
+    labels = result['labels'][result['rows']]
+    
+    # Sorted silhouettes of each cluster, thinned to quantiles for the browser
+    curves = []
+    offset = 0
+    for cluster in summary.index:
+        values = np.sort(result['values'][labels == cluster])
+        positions = np.unique(np.linspace(0, len(values) - 1, min(len(values), 300)).astype(int))
+        curves.append(pd.DataFrame({
+            'position': offset + positions * summary.loc[cluster, 'size'] / len(values),
+            'silhouette': values[positions],
+            'cluster': f"Cluster {cluster}",
+        }))
+        offset += summary.loc[cluster, 'size'] + summary['size'].sum() * 0.02
+    
+    profile_col, summary_col = st.columns([2, 1])
+    with profile_col:
+        fig = px.area(
+            pd.concat(curves),
+            x='position',
+            y='silhouette',
+            color='cluster',
+            labels={'position': 'Customers (sorted within each cluster)', 'silhouette': 'Silhouette', 'cluster': ''}
+        )
+        fig.add_hline(y=result['score'], line_dash='dash', line_color='red')
+        fig.update_layout(title=f"Silhouette plot for {k} clusters (average {result['score']:.3f})")
+        plotly_chart(fig, use_container_width=True)
+    with summary_col:
+        fig = px.bar(
+            x=[f"Cluster {cluster}" for cluster in summary.index],
+            y=summary['mean'],
+            error_y=summary['upper'] - summary['mean'],
+            labels={'x': '', 'y': 'Mean silhouette'}
+        )
+        fig.update_layout(title="Mean Silhouette per Cluster")
+        plotly_chart(fig, use_container_width=True)
+    st.dataframe(summary.round(3))
+
+
+def dbscan_explorer(feature_set, default_eps):
+    """k-distance curve and DBSCAN sweeps computed from one cached neighbour graph."""
+    store = load_customer_store(clustering.DATA_FILE, data_store.source_signature(clustering.DATA_FILE))
+    graph_key = clustering.neighbour_graph_key(store, feature_set)
+    
+    if not st.toggle("Explore eps and min_samples interactively", key=f'dbscan_explore_{feature_set}'):
+        return
+    job = submit_job(
+        graph_key,
+        clustering.open_neighbour_graph,
+        store, feature_set,
+        description=f"Neighbour graph of {feature_set}"
+    )
+    if not job.done:
+        job_progress(graph_key)
+        return
+    if job.error is not None:
+        job_error(job, "Could not build the neighbour graph")
+        return
+    graph = job.result
+    
+    # k-distance curve with the detected elbow (thinned out for the browser)
+    curve = graph.k_distance_curve()
+    elbow = density.find_elbow(curve)
+    positions = np.unique(np.concatenate([np.linspace(0, len(curve) - 1, 2000).astype(int), [elbow]]))
+    fig = px.line(
+        x=positions,
+        y=curve[positions],
+        labels={'x': 'Points sorted by distance', 'y': f'Distance to neighbour {density.K_DISTANCE_NEIGHBORS}'}
+    )
+    fig.add_scatter(x=[elbow], y=[curve[elbow]], mode='markers', marker=dict(size=10, color='red'), name='Elbow')
+    fig.update_layout(title='k-distance curve (zoom in with the mouse)', showlegend=False)
+    plotly_chart(fig, use_container_width=True)
+    st.write(f"Detected elbow at eps ≈ **{curve[elbow]:.2f}**.")
+    
+    eps = st.slider(
+        'eps',
+        min_value=0.05,
+        max_value=graph.max_eps,
+        value=min(default_eps, graph.max_eps),
+        step=0.01,
+        key=f'dbscan_eps_{feature_set}'
+    )
+    min_samples_range = st.slider('min_samples', 2, 30, (2, 14), key=f'dbscan_min_samples_{feature_set}')
+    min_samples_values = list(range(min_samples_range[0], min_samples_range[1] + 1))
+    
+    sweep_key = clustering.dbscan_sweep_key(store, feature_set, eps, min_samples_values)
+    sweep_job = submit_job(
+        sweep_key,
+        clustering.cached_dbscan_sweep,
+        load_result_cache(), store, feature_set, eps, min_samples_values,
+        description=f"DBSCAN sweep at eps={eps:g}",
+        cache=load_result_cache()
+    )
+    if not sweep_job.done:
+        job_progress(sweep_key)
+    elif sweep_job.error is not None:
+        job_error(sweep_job, "DBSCAN sweep failed")
+    else:
+        sweep = sweep_job.result
+        fig = px.line(
+            sweep,
+            x='min_samples',
+            y=['clusters', 'noise'],
+            markers=True,
+            facet_row='variable',
+            labels={'value': '', 'variable': ''}
+        )
+        fig.update_yaxes(matches=None)
+        fig.update_layout(title=f'Clusters and noise points at eps={eps:g}', showlegend=False)
+        plotly_chart(fig, use_container_width=True)
+        st.dataframe(sweep, hide_index=True)
+
+
+def live_clustering(feature_set):
+    """Cluster a feature set with user chosen parameters in the background."""
+    store = load_customer_store(clustering.DATA_FILE, data_store.source_signature(clustering.DATA_FILE))
+    cache = load_result_cache()
+    
+    algorithm = st.selectbox(
+        'Algorithm',
+        options=list(clustering.ALGORITHMS),
+        format_func=lambda x: clustering.ALGORITHMS[x][0],
+        key=f'live_algorithm_{feature_set}'
+    )
+    defaults = clustering.default_params(algorithm, feature_set)
+    params = dict(defaults)
+    if algorithm == 'kmeans':
+        params['n_clusters'] = st.slider('Number of clusters', 2, 10, defaults['n_clusters'], key=f'live_k_{feature_set}')
+        params['n_init'] = int(st.number_input('Initialisations', 1, 50, defaults['n_init'], key=f'live_n_init_{feature_set}'))
+    elif algorithm == 'dbscan':
+        params['eps'] = float(st.number_input('eps', 0.05, 5.0, defaults['eps'], step=0.05, key=f'live_eps_{feature_set}'))
+        params['min_samples'] = st.slider('min_samples', 2, 30, defaults['min_samples'], key=f'live_min_samples_{feature_set}')
+    elif algorithm == 'hierarchical':
+        params['n_clusters'] = st.slider('Number of clusters', 2, 10, defaults['n_clusters'], key=f'live_{algorithm}_k_{feature_set}')
+        params['linkage'] = st.selectbox('Linkage', ['ward', 'complete', 'average', 'single'], key=f'live_{algorithm}_linkage_{feature_set}')
+    elif algorithm in ('som_kmeans', 'som_hierarchical'):
+        params['n_clusters'] = st.slider('Number of clusters of the SOM nodes', 2, 10, defaults['n_clusters'], key=f'live_{algorithm}_k_{feature_set}')
+        if algorithm == 'som_hierarchical':
+            params['linkage'] = st.selectbox('Linkage', ['ward', 'complete', 'average', 'single'], key=f'live_linkage_{feature_set}')
+    
+    # Configurations already in the cache are shown straight away
+    key = clustering.result_key(store, feature_set, algorithm, params)
+    run = st.button('Run clustering', key=f'live_run_{feature_set}')
+    if run or key in cache or key in st.session_state.get('job_retries', set()):
+        submit_job(
+            key,
+            clustering.cached_clustering,
+            cache, store, feature_set, algorithm, params,
+            description=f"{clustering.ALGORITHMS[algorithm][0]} on {feature_set}",
+            cache=cache
+        )
+    
+    job = load_job_manager().get(key)
+    if job is None:
+        st.info("Choose the parameters and press 'Run clustering'.")
+    elif not job.done:
+        job_progress(key)
+    elif job.error is not None:
+        job_error(job, "Clustering failed")
+    else:
+        result = job.result
+        summary = f"{int((result['counts'].index >= 0).sum())} clusters"
+        if 'noise' in result['metrics']:
+            summary += f", {result['metrics']['noise']:,} noise points"
+        if 'quantization_error' in result['metrics']:
+            summary += f", SOM quantization error {result['metrics']['quantization_error']:.3f}"
+        if 'micro_clusters' in result['metrics']:
+            summary += f", tree built on {result['metrics']['micro_clusters']:,} micro-clusters"
+        if 'inertia' in result['metrics']:
+            summary += f", inertia {result['metrics']['inertia']:,.1f}"
+        if 'silhouette' in result['metrics']:
+            score, lower, upper = result['metrics']['silhouette']
+            summary += f", silhouette {score:.3f} (95% CI {lower:.3f} to {upper:.3f})"
+        st.caption(summary)
+        plot_cluster_profile(result['profile'], result['counts'])
+
+
+CLUSTERING_APPROACHES = [
+    "Hierarchical + K-means",
+    "SOM + K-means",
+    "SOM + Hierarchical",
+    "DBSCAN",
+    "Combined Results",
+    "Live Clustering"
+]
 
 # Create sidebar navigation
 st.sidebar.title('Navigation')
 page = st.sidebar.radio('Go to', ['EDA Raw Data', 'Segmentation & Clustering', 'Final Clusterization'])
 
+# Plots are served resized from memory; full resolution is only read on demand
+plot_quality = st.sidebar.select_slider(
+    'Plot quality',
+    options=['thumbnail', 'display', 'original'],
+    value='display',
+    format_func=lambda x: {'thumbnail': 'Thumbnail', 'display': 'Standard', 'original': 'Full resolution'}[x]
+)
+
+# Every rerun is traced; the panel shows the last reruns of this session
+show_performance = st.sidebar.toggle('Performance panel', key='show_performance')
+trace = start_trace(page)
+
 # EDA (Exploratory Data Analysis) page        
 if page == 'EDA Raw Data':
     st.title('Exploratory Data Analysis')
     st.write('Upload your data and explore key insights through visualizations and statistics.')
     
-    # Update the path to use interface/plots
-    plot_directory = 'interface/plots/rawData/Distributions'
+    # Plots come from the manifest built at startup instead of listing the directory
+    plot_directory = 'rawData/Distributions'
     
     try:
-        # Check if directory exists
-        if not os.path.exists(plot_directory):
-            st.error(f"Directory not found: {plot_directory}")
-            st.info("Please make sure the plots directory is properly set up.")
-        else:
-            plot_options = [f for f in os.listdir(plot_directory) if f.endswith(('.png', '.jpg', '.jpeg'))]
+        with trace.span('plot manifest'):
+            plot_options = {asset.name: asset.key for asset in load_plot_manifest().listdir(plot_directory)}
+        
+        # Check if there are any plot options available
+        if plot_options:
+            # Dropdown menu to select a plot
+            selected_plot = st.selectbox('Select a plot to display:', list(plot_options))
             
-            # Check if there are any plot options available
-            if plot_options:
-                # Remove the file extensions for the selectbox options
-                plot_options_no_ext = [os.path.splitext(f)[0] for f in plot_options]
-                
-                # Dropdown menu to select a plot
-                selected_plot = st.selectbox('Select a plot to display:', plot_options_no_ext)
-                
-                # Display the selected plot
-                st.image(os.path.join(plot_directory, selected_plot + os.path.splitext(plot_options[0])[1]), 
-                        width=None)
-            else:
-                st.warning("No image files found in the plots directory.")
-                st.info("Please add some .png, .jpg, or .jpeg files to the plots directory.")
+            # Display the selected plot
+            show_plot(plot_options[selected_plot])
+        else:
+            st.warning(f"No image files found in {os.path.join(assets.PLOTS_DIR, plot_directory)}.")
+            st.info("Please add some .png, .jpg, or .jpeg files to the plots directory.")
     except Exception as e:
         st.error(f"Error accessing plots directory: {str(e)}")
 
@@ -46,10 +609,15 @@ elif page == 'Segmentation & Clustering':
     st.title('Segmentation & Clustering')
     st.write('Discover patterns in your data through advanced clustering techniques.')
     
-    # Replace radio button with tabs for method selection
-    method_tab1, method_tab2 = st.tabs(["Demographic Preferences", "Purchase Behavior"])
+    # Only the selected section is rendered, so hidden plots are never sent
+    method = st.radio(
+        'Segmentation perspective',
+        ["Demographic Preferences", "Purchase Behavior"],
+        horizontal=True,
+        label_visibility='collapsed'
+    )
     
-    with method_tab1:
+    if method == "Demographic Preferences":
         # Elbow Method Analysis section for Demographics
         st.header("Optimal Number of Clusters Analysis")
         st.write("""
@@ -59,7 +627,7 @@ elif page == 'Segmentation & Clustering':
         """)
         
         try:
-            st.image('interface/plots/clustering/demographic/elbow_method.png', width=None)
+            elbow_chart('demographics_preferences', 'clustering/demographic/elbow_method')
             st.write("""
             **Analysis of Elbow Method Results:**
             Based on the graph above is not clear if we should choose 3 or 4 clusters. 
@@ -68,22 +636,20 @@ elif page == 'Segmentation & Clustering':
         except Exception as e:
             st.error(f"Error loading elbow method plot: {str(e)}")
 
-        # Demographic clustering analysis tabs
-        demo_tab1, demo_tab2, demo_tab3, demo_tab4, demo_tab5 = st.tabs([
-            "Hierarchical + K-means",
-            "SOM + K-means",
-            "SOM + Hierarchical",
-            "DBSCAN",
-            "Combined Results"
-        ])
+        # Demographic clustering analysis sections
+        demo_method = st.radio(
+            'Clustering approach',
+            CLUSTERING_APPROACHES,
+            horizontal=True,
+            key='demographic_approach'
+        )
         
-        with demo_tab1:
+        if demo_method == "Hierarchical + K-means":
             st.subheader("Hierarchical + K-means Clustering")
             try:
                 # Silhouette Analysis
                 st.write("### Silhouette Analysis")
-                st.image('interface/plots/clustering/demographic/hierarchical_kmeans/silhouette.png', 
-                       width=None)
+                silhouette_chart('demographics_preferences', 'clustering/demographic/hierarchical_kmeans/silhouette')
                 st.write("""
                         It is not very common to see the silhouette_score decreasing as we add more clusters.
                         However, the dataset might have a strong natural separation into 2 groups.
@@ -92,8 +658,7 @@ elif page == 'Segmentation & Clustering':
                 
                 # Cluster Profiles
                 st.write("### Cluster Profiles")
-                st.image('interface/plots/clustering/demographic/hierarchical_kmeans/cluster_profiles_3.png', 
-                       width=None)
+                show_plot('clustering/demographic/hierarchical_kmeans/cluster_profiles_3')
                 st.write("""
                 Analysis of 3-cluster solution:
                 - Shows the distribution of features across three distinct groups
@@ -101,8 +666,7 @@ elif page == 'Segmentation & Clustering':
                 - We can observe the main characteristics that define each group
                 """)
                 
-                st.image('interface/plots/clustering/demographic/hierarchical_kmeans/cluster_profiles_4.png', 
-                       width=None)
+                show_plot('clustering/demographic/hierarchical_kmeans/cluster_profiles_4')
                 st.write("""
                 Analysis of 4-cluster solution:
                 - Provides a more granular segmentation
@@ -112,13 +676,12 @@ elif page == 'Segmentation & Clustering':
             except Exception as e:
                 st.error(f"Error loading Hierarchical + K-means visualizations: {str(e)}")
                 
-        with demo_tab2:
+        if demo_method == "SOM + K-means":
             st.subheader("SOM + K-means Clustering")
             try:
                 # Hit Map View
                 st.write("### SOM Hit Map")
-                st.image('interface/plots/clustering/demographic/som_kmeans/hitMapView.png', 
-                       width=None)
+                show_plot('clustering/demographic/som_kmeans/hitMapView')
                 st.write("""
                 The SOM hit map shows the distribution of data points across the self-organizing map:
                 - Each cell represents a node in the SOM
@@ -127,31 +690,27 @@ elif page == 'Segmentation & Clustering':
                 
                 # Inertia Plot
                 st.write("### Inertia Analysis")
-                st.image('interface/plots/clustering/demographic/som_kmeans/inertia.png', 
-                       width=None)
+                show_plot('clustering/demographic/som_kmeans/inertia')
                 st.write("""Beyond 4 clusters, the decrease in inertia slows down, which suggests diminishing returns for adding more clusters.
                             The "elbow point" appears to be at 4 clusters, where the rate of improvement in inertia reduction becomes less pronounced.""")
 
                 # Final Clusters
                 st.write("### Final Clusters")
-                st.image('interface/plots/clustering/demographic/som_kmeans/final_cluster.png',
-                       width=None)
+                show_plot('clustering/demographic/som_kmeans/final_cluster')
                 st.write("Visualization of the final cluster assignments")
             except Exception as e:
                 st.error(f"Error loading SOM + K-means visualizations: {str(e)}")
                 
-        with demo_tab3:
+        if demo_method == "SOM + Hierarchical":
             st.subheader("SOM + Hierarchical Clustering")
             try:
                 # Hit Map View
                 st.write("### SOM Hit Map")
-                st.image('interface/plots/clustering/demographic/som_hierarchichal/hitMapView.png', 
-                       width=None)
+                show_plot('clustering/demographic/som_hierarchichal/hitMapView')
                 
                 # Dendrogram
                 st.write("### Hierarchical Clustering Dendrogram")
-                st.image('interface/plots/clustering/demographic/som_hierarchichal/dendogram.png', 
-                       width=None)
+                dendrogram_chart('demographics_preferences', 'clustering/demographic/som_hierarchichal/dendogram')
                 st.write("""
                 The threshold (red line) intersects just below a noticeable "gap" in the dendrogram.
                 Above this threshold, the vertical distances between clusters are much larger, meaning clusters are more distinct.
@@ -161,41 +720,39 @@ elif page == 'Segmentation & Clustering':
                 
                 # Cluster Profiles
                 st.write("### Cluster Profiles")
-                st.image('interface/plots/clustering/demographic/som_hierarchichal/cluster_profiles_6.png', 
-                       width=None)
+                show_plot('clustering/demographic/som_hierarchichal/cluster_profiles_6')
             except Exception as e:
                 st.error(f"Error loading SOM + Hierarchical visualizations: {str(e)}")
                 
-        with demo_tab4:
+        if demo_method == "DBSCAN":
             st.subheader("DBSCAN Clustering")
             try:
                 # Epsilon Selection
                 st.write("### Epsilon Parameter Selection")
-                st.image('interface/plots/clustering/demographic/dbscan/eps.png', 
-                       width=None)
+                show_plot('clustering/demographic/dbscan/eps')
                 st.write("""
                          This plot above is typically used for determining an appropriate value for the epsilon (eps) parameter in DBSCAN clustering. The idea is to find the "elbow point" on the graph, which indicates the distance value where the curve transitions from a steep increase to a flatter slope. This point is a good candidate for the eps parameter, as it represents a natural clustering distance threshold in the data. 
                 """)
 
-                st.image('interface/plots/clustering/demographic/dbscan/epsZoom.png', 
-                       width=None)
+                show_plot('clustering/demographic/dbscan/epsZoom')
                 st.write("""
                          After zooming in, we can see in the graph above that the elbow point is around 1.0, so that is the number that we are going to choose for eps.
                          """)
                 
                 # Cluster Profiles
                 st.write("### Cluster Profiles")
-                st.image('interface/plots/clustering/demographic/dbscan/cluster_profiles_5.png', 
-                       width=None)
+                show_plot('clustering/demographic/dbscan/cluster_profiles_5')
+
+                st.write("### Interactive Parameter Selection")
+                dbscan_explorer('demographics_preferences', 1.0)
             except Exception as e:
                 st.error(f"Error loading DBSCAN visualizations: {str(e)}")
                 
-        with demo_tab5:
+        if demo_method == "Combined Results":
             st.subheader("Combined Results")
             try:
                 st.write("### Cluster Profiling Comparison")
-                st.image('interface/plots/clustering/demographic/combined_results/cluster_profiling.png', 
-                       width=None)
+                show_plot('clustering/demographic/combined_results/cluster_profiling')
                 st.write("""
                 Comparison of clustering results across different methods:
                 - Shows how different approaches segment the customers
@@ -204,8 +761,15 @@ elif page == 'Segmentation & Clustering':
                 """)
             except Exception as e:
                 st.error(f"Error loading combined results: {str(e)}")
+        
+        if demo_method == "Live Clustering":
+            st.subheader("Live Clustering")
+            try:
+                live_clustering('demographics_preferences')
+            except Exception as e:
+                st.error(f"Error running live clustering: {str(e)}")
             
-    with method_tab2:
+    else:
         # Elbow Method Analysis section for Purchase Behavior
         st.header("Optimal Number of Clusters Analysis")
         st.write("""
@@ -215,43 +779,39 @@ elif page == 'Segmentation & Clustering':
         """)
         
         try:
-            st.image('interface/plots/clustering/purchase/elbow_method.png', width=None)
+            elbow_chart('purchase_behavior', 'clustering/purchase/elbow_method')
             st.write("""
             **Analysis of Elbow Method Results:**
                      Based on the R² plot the correct number of clusters might be 3 or 4, but the choice isn't clear.
             """)
             
-            # Purchase behavior clustering analysis tabs
-            purchase_tab1, purchase_tab2, purchase_tab3, purchase_tab4, purchase_tab5 = st.tabs([
-                "Hierarchical + K-means",
-                "SOM + K-means",
-                "SOM + Hierarchical",
-                "DBSCAN",
-                "Combined Results"
-            ])
-
-            with purchase_tab1:
+            # Purchase behavior clustering analysis sections
+            purchase_method = st.radio(
+                'Clustering approach',
+                CLUSTERING_APPROACHES,
+                horizontal=True,
+                key='purchase_approach'
+            )
+
+            if purchase_method == "Hierarchical + K-means":
                 st.subheader("Hierarchical + K-means Clustering")
                 try:
                     st.write("### Silhouette Analysis")
-                    st.image('interface/plots/clustering/purchase/hierarchical_kmeans/silhouette.png', 
-                           width=None)
+                    silhouette_chart('purchase_behavior', 'clustering/purchase/hierarchical_kmeans/silhouette')
                     st.write("""
                              Based on the graph above the choice is more clear. We are going to choose 3 clusters. The gain in silhouette score between 3 and 4 is very low. With 3 clusters, the results are simpler to interpret and visualize.
                              """)
                     
                     st.write("### Final Cluster")
-                    st.image('interface/plots/clustering/purchase/hierarchical_kmeans/final_cluster.png', 
-                           width=None)
+                    show_plot('clustering/purchase/hierarchical_kmeans/final_cluster')
                 except Exception as e:
                     st.error(f"Error loading Hierarchical + K-means visualizations: {str(e)}")
             
-            with purchase_tab2:
+            if purchase_method == "SOM + K-means":
                 st.subheader("SOM + K-means Clustering")
                 try:
                     st.write("### Inertia Analysis") 
-                    st.image('interface/plots/clustering/purchase/som_kmeans/inertia.png',
-                           width=None)
+                    show_plot('clustering/purchase/som_kmeans/inertia')
                     st.write("""
                     Beyond 3 clusters, the decrease in inertia slows down, which suggests diminishing returns for adding more clusters.
                     
@@ -259,20 +819,17 @@ elif page == 'Segmentation & Clustering':
                     """)
                     
                     st.write("### Hit Map View")
-                    st.image('interface/plots/clustering/purchase/som_kmeans/hitMapView.png',
-                           width=None)
+                    show_plot('clustering/purchase/som_kmeans/hitMapView')
                     
                     st.write("### Final Cluster")
-                    st.image('interface/plots/clustering/purchase/som_kmeans/final_cluster_3.png',
-                           width=None)
+                    show_plot('clustering/purchase/som_kmeans/final_cluster_3')
                 except Exception as e:
                     st.error(f"Error loading SOM + K-means visualizations: {str(e)}")
-            with purchase_tab3:
+            if purchase_method == "SOM + Hierarchical":
                 st.subheader("SOM + Hierarchical Clustering")
                 try:
                     st.write("### Dendrogram")
-                    st.image('interface/plots/clustering/purchase/som_hierarchical/dendogram.png', 
-                           width=None)
+                    dendrogram_chart('purchase_behavior', 'clustering/purchase/som_hierarchical/dendogram')
                     st.write("""
                     The threshold (red line) intersects just below a noticeable "gap" in the dendrogram.
                     Above this threshold, the vertical distances between clusters are much larger, meaning clusters are more distinct.
@@ -281,45 +838,49 @@ elif page == 'Segmentation & Clustering':
                     """)
                     
                     st.write("### Hit Map View")
-                    st.image('interface/plots/clustering/purchase/som_hierarchical/hitMapView.png', 
-                           width=None)
+                    show_plot('clustering/purchase/som_hierarchical/hitMapView')
                     
                     st.write("### Final Cluster")
-                    st.image('interface/plots/clustering/purchase/som_hierarchical/final_cluster.png', 
-                           width=None)
+                    show_plot('clustering/purchase/som_hierarchical/final_cluster')
                 except Exception as e:
                     st.error(f"Error loading SOM + Hierarchical visualizations: {str(e)}")
                     
-            with purchase_tab4:
+            if purchase_method == "DBSCAN":
                 st.subheader("DBSCAN Clustering")
                 try:
                     st.write("### Epsilon Parameter Selection")
-                    st.image('interface/plots/clustering/purchase/dbscan/eps.png', 
-                           width=None)
+                    show_plot('clustering/purchase/dbscan/eps')
                     st.write("""
                              One more time the right eps isn't clear in the graph above.
                              """)
                     st.write("### Zooming in on the elbow part")
-                    st.image('interface/plots/clustering/purchase/dbscan/epsZoom.png', 
-                           width=None)
+                    show_plot('clustering/purchase/dbscan/epsZoom')
                     st.write("""
                              After zooming in we can see that the "elbow" appears to be somewhere around the 0.25 - 0.30 range on the y-axis, which suggests that eps might be in this range. There isn't a choice that is 100% right. We are going to choose eps= 0.30 but it is a little bit subjective.
                              """)
                     
                     st.write("### Cluster Profiling")
-                    st.image('interface/plots/clustering/purchase/dbscan/cluster_profiling.png', 
-                           width=None)
+                    show_plot('clustering/purchase/dbscan/cluster_profiling')
+
+                    st.write("### Interactive Parameter Selection")
+                    dbscan_explorer('purchase_behavior', 0.30)
                 except Exception as e:
                     st.error(f"Error loading DBSCAN visualizations: {str(e)}")
                     
-            with purchase_tab5:
+            if purchase_method == "Combined Results":
                 st.subheader("Combined Results")
                 try:
                     st.write("### Combined Cluster Analysis")
-                    st.image('interface/plots/clustering/purchase/combined_clusters/combined_clusters.png', 
-                           width=None)
+                    show_plot('clustering/purchase/combined_clusters/combined_clusters')
                 except Exception as e:
                     st.error(f"Error loading combined results: {str(e)}")
+            
+            if purchase_method == "Live Clustering":
+                st.subheader("Live Clustering")
+                try:
+                    live_clustering('purchase_behavior')
+                except Exception as e:
+                    st.error(f"Error running live clustering: {str(e)}")
 
         except Exception as e:
             st.error(f"Error loading purchase behavior analysis: {str(e)}")
@@ -330,23 +891,9 @@ else:
     st.write('Explore customer segments through interactive 3D visualization.')
     
     try:
-        # Load the data with cluster labels
-        df = pickle.load(open("customer_id_merged_unscaled.pkl", "rb"))
-        
-        # Add a slider to filter customer age
-        min_age, max_age = int(df['customer_age'].min()), int(df['customer_age'].max())
-        selected_age = st.slider(
-            'Select Customer Age Range:',
-            min_value=min_age,
-            max_value=max_age,
-            value=(min_age, max_age)
-        )
-        
-        # Filter the DataFrame based on selected age range
-        filtered_df = df[
-            (df['customer_age'] >= selected_age[0]) & 
-            (df['customer_age'] <= selected_age[1])
-        ]
+        # Load the data with cluster labels (shared, memory-mapped store)
+        with trace.span('load store'):
+            store = load_customer_store(CUSTOMER_DATA, data_store.source_signature(CUSTOMER_DATA))
         
         # Define available features for axis selection
         available_features = [
@@ -359,6 +906,37 @@ else:
             'log_vendor_count'
         ]
         
+        # Sort-order indexes turn every range filter into two binary searches
+        with trace.span('load indexes'):
+            indexes = load_sorted_indexes(store, store.version, tuple(available_features))
+        
+        # Add a slider to filter customer age
+        age_stats = store.stats['customer_age']
+        min_age, max_age = int(age_stats['min']), int(age_stats['max'])
+        selected_age = st.slider(
+            'Select Customer Age Range:',
+            min_value=min_age,
+            max_value=max_age,
+            value=(min_age, max_age)
+        )
+        
+        # Range filters on the other features, only applied when narrowed
+        ranges = {'customer_age': selected_age}
+        with st.expander("More filters"):
+            for feature in available_features:
+                if feature == 'customer_age':
+                    continue
+                lo, hi = float(store.stats[feature]['min']), float(store.stats[feature]['max'])
+                selected_range = st.slider(
+                    feature.replace('_', ' ').title(),
+                    min_value=lo,
+                    max_value=hi,
+                    value=(lo, hi),
+                    key=f'filter_{feature}'
+                )
+                if selected_range != (lo, hi):
+                    ranges[feature] = selected_range
+        
         # Add selection boxes for X, Y, and Z axes
         x_axis = st.selectbox("Select X-axis", options=available_features, index=0)
         y_axis = st.selectbox("Select Y-axis", options=[feature for feature in available_features if feature != x_axis], index=1)
@@ -371,53 +949,82 @@ else:
             format_func=lambda x: 'Cluster' if x == 'merged_labels' else 'Customer Age'
         )
         
-        # Update the scatter plot creation
-        fig = px.scatter_3d(
-            filtered_df,
-            x=x_axis,
-            y=y_axis,
-            z=z_axis,
-            color=color_by,
-            color_continuous_scale='Cividis' if color_by == 'customer_age' else None,
-            color_discrete_sequence=['#E41A1C', '#4DAF4A', '#377EB8'] if color_by == 'merged_labels' else None,
-            labels={
-                x_axis: x_axis.replace('_', ' ').title(),
-                y_axis: y_axis.replace('_', ' ').title(),
-                z_axis: z_axis.replace('_', ' ').title(),
-                'merged_labels': 'Cluster',
-                'customer_age': 'Customer Age'
-            },
-            title='Customer Distribution in 3D Space'
-        )
-
-        # Update the layout for better visualization
-        fig.update_layout(
-            scene=dict(
-                xaxis_title=x_axis.replace('_', ' ').title(),
-                yaxis_title=y_axis.replace('_', ' ').title(),
-                zaxis_title=z_axis.replace('_', ' ').title(),
-                bgcolor='rgb(30, 30, 30)'  # Ensure background remains dark
-            ),
-            paper_bgcolor='rgb(30, 30, 30)',  # Set the overall paper background to dark
-            margin=dict(l=0, r=0, b=0, t=30),
-            scene_camera=dict(
-                up=dict(x=0, y=0, z=1),
-                center=dict(x=0, y=0, z=0),
-                eye=dict(x=1.5, y=1.5, z=1.5)
+        # Level of detail: the browser only receives a bounded number of points
+        with st.expander("Rendering options"):
+            point_budget = st.number_input(
+                "Point budget",
+                min_value=1000,
+                max_value=500000,
+                value=20000,
+                step=1000,
+                help="Maximum number of customers sent to the browser. Larger selections are reduced."
             )
-        )
-
-        # Update marker properties for better visibility on dark background
-        fig.update_traces(
-            marker=dict(
-                size=3,  # Slightly larger size for better visibility
-                opacity=0.8,  # Reduced opacity (0.6 instead of 0.8)
-                line=dict(width=0.05, color='rgba(255, 255, 255, 0.3)')  # Thinner, more transparent white border
+            lod_mode = st.radio(
+                "Reduce large selections by:",
+                options=['sample', 'voxels'],
+                format_func=lambda x: 'Stratified sample' if x == 'sample' else 'Density voxels',
+                horizontal=True
             )
+            voxel_resolution = st.slider("Voxels per axis", min_value=8, max_value=64, value=24)
+            
+            # Zooming into a sub-volume: below the budget every customer in it is shown
+            st.write("Zoom into a sub-volume:")
+            zoom_bounds = []
+            for axis in [x_axis, y_axis, z_axis]:
+                lo, hi = float(store.stats[axis]['min']), float(store.stats[axis]['max'])
+                zoom_bounds.append(st.slider(axis.replace('_', ' ').title(), min_value=lo, max_value=hi, value=(lo, hi)))
+        
+        # Customers to plot: cached per selection, so colour and axis changes skip filtering
+        axes = (x_axis, y_axis, z_axis)
+        zoom = tuple(
+            (axis, bounds) for axis, bounds in zip(axes, zoom_bounds)
+            if bounds != (float(store.stats[axis]['min']), float(store.stats[axis]['max']))
         )
+        selection = (store.version, tuple(sorted(ranges.items())), zoom, point_budget, lod_mode)
+        with trace.span('filter'):
+            rows, split, n_selected, filtered_rows = load_plotted_rows(store, indexes, *selection)
+        use_voxels = lod_mode == 'voxels' and n_selected > point_budget
+        
+        with trace.span('figure'):
+            fig, n_points = load_scatter_figure(
+                store, rows, split, selection, axes, color_by, voxel_resolution if use_voxels else None
+            )
+        if use_voxels:
+            st.caption(f"{n_selected:,} customers aggregated into {n_points:,} voxels (marker size shows density).")
+        elif n_points < n_selected:
+            st.caption(f"Showing a stratified sample of {n_points:,} out of {n_selected:,} customers.")
 
         # Display the plot in Streamlit
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig, use_container_width=True, key='customer_scatter')
+        
+        # Age ranges are profiled from the aggregate cube, other filters from the filtered rows
+        st.write("### Cluster Profiles of the Selection")
+        with trace.span('load cube'):
+            aggregates = load_aggregate_cube(store, store.version, tuple(available_features))
+        profile_level = st.radio(
+            "Profile clusters of:",
+            options=cube.LABEL_COLUMNS,
+            format_func=lambda x: {
+                'merged_labels': 'Final clusters',
+                'demographics_labels': 'Demographic clusters',
+                'purchase_behavior_labels': 'Purchase behavior clusters'
+            }[x],
+            horizontal=True
+        )
+        with trace.span('profile'):
+            if set(ranges) - {cube.AGE_COLUMN}:
+                means, variances, counts = cube.row_profile(store, filtered_rows, available_features, by=profile_level)
+            else:
+                means, variances, counts = aggregates.profile(ranges[cube.AGE_COLUMN], by=profile_level)
+        if counts.sum() == 0:
+            st.info("No customers match the selected filters.")
+        else:
+            # Standardized against the whole customer base, so features share one axis
+            overall_means, overall_stds = aggregates.totals()
+            plot_cluster_profile((means - overall_means) / overall_stds, counts)
+            table = means.round(2).astype(str) + ' ± ' + np.sqrt(variances).round(2).astype(str)
+            table.insert(0, 'Customers', counts)
+            st.dataframe(table)
         
         # Add color scale explanation
         st.write(f"""
@@ -438,6 +1045,72 @@ else:
         - Hover over points to see detailed information
         """)
 
+        # 2D overview: PCA right away, t-SNE once its background layout is ready
+        st.write("### 2D Map of the Clusters")
+        layout_name = st.radio(
+            "Layout:",
+            options=['pca', 'tsne'],
+            format_func=lambda x: 'PCA' if x == 'pca' else 't-SNE',
+            horizontal=True,
+            key='embedding_layout'
+        )
+        with trace.span('embedding'):
+            layout, layout_coords = load_pca_layout(store, store.version)
+        layout_title = 'PCA'
+        if layout_name == 'tsne':
+            key = embedding.tsne_path(store.version)
+            job = submit_job(
+                key,
+                embedding.trained_tsne,
+                store, scoring_pipeline(),
+                description="t-SNE layout"
+            )
+            if not job.done:
+                st.caption("The PCA layout is shown until the t-SNE layout is ready.")
+                job_progress(key)
+            elif job.error is not None:
+                job_error(job, "t-SNE layout failed")
+            else:
+                layout, layout_coords, layout_title = job.result, job.result.coords, 't-SNE'
+        
+        # The customers of the current selection, sampled to the point budget
+        map_rows, map_split, _, _ = load_plotted_rows(store, indexes, *selection[:-1], 'sample')
+        
+        # Newly scored customers are placed on the existing layout, not laid out again
+        new_customers = st.file_uploader(
+            "Place new customers on the map (CSV with the unscaled customer features)",
+            type='csv',
+            key='embedding_new_customers'
+        )
+        new_coords = new_labels = None
+        if new_customers is not None:
+            pipeline = scoring_pipeline()
+            new_df = pd.read_csv(new_customers)
+            missing = [name for name in pipeline.feature_names if name not in new_df.columns]
+            if missing:
+                st.error(f"Missing columns: {', '.join(missing)}")
+            else:
+                features = new_df[pipeline.feature_names].to_numpy()
+                new_labels = pipeline.score_array(features)[scoring.MERGED_LABEL]
+                new_coords = layout.place(pipeline.transform(features))
+                placement = 'nearest landmark customers' if layout_title == 't-SNE' else 'principal components'
+                st.caption(f"{len(new_df):,} new customers placed by their {placement}; the layout is not recomputed.")
+        
+        fig = figures.scatter_2d(
+            map_split.clusters,
+            [map_split.split(layout_coords[map_rows, axis]) for axis in range(2)],
+            layout_title,
+            new_coords=new_coords,
+            new_labels=new_labels,
+            uirevision=f'{store.version}-{layout_title}'
+        )
+        plotly_chart(fig, use_container_width=True, key='customer_map')
+
     except Exception as e:
         st.error(f"Error loading 3D visualization: {str(e)}")
         st.info("Please make sure the data file is available and contains the required columns.")
+
+trace.finish()
+load_trace_sink().write(trace)
+if show_performance:
+    performance_panel(st.session_state['rerun_traces'])
@@ -0,0 +1,126 @@
+"""Background jobs for long computations triggered from the interface.
+
+Jobs run in a thread pool shared by every session of the process, so the
+script reruns never block on them. The heavy lifting (NumPy, scikit-learn)
+releases the GIL, which is why threads are enough here. Jobs are identified by
+the key of the result they produce: submitting a key that is already queued,
+running or finished returns the existing job instead of starting a new one.
+Failed jobs are kept as well, so that the interface can show their error, and
+are only run again when a retry is asked for.
+
+Jobs whose function stores its result in a ``ResultCache`` under the job key
+keep no copy of it: ``job.result`` reads it back from the cache, so finished
+jobs stay within the cache's size limit.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """State and progress of a single submitted computation."""
+
+    def __init__(self, key, description='', cache=None):
+        self.key = key
+        self.description = description
+        self.cache = cache
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = 'Waiting for a free worker'
+        self._result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def result(self):
+        if self.cache is not None and self.status == DONE:
+            return self.cache.get(self.key)
+        return self._result
+
+    @property
+    def stale(self):
+        """Whether the cached result of a finished job has since been evicted."""
+        return self.cache is not None and self.status == DONE and self.key not in self.cache
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def report(self, fraction, message=None):
+        """Progress callback handed to the job function."""
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+
+class JobManager:
+    """Thread pool with de-duplicated, pollable jobs."""
+
+    def __init__(self, max_workers=2, max_jobs=200):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='jobs')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._jobs.get(key)
+
+    def submit(self, key, fn, *args, description='', cache=None, retry=False, **kwargs):
+        """Run ``fn(*args, progress=job.report, **kwargs)`` in the background.
+
+        An existing job for ``key`` is returned as is, unless it failed and
+        ``retry`` is set, or its result has been evicted from ``cache``.
+        With a ``cache``, ``fn`` must store its result in it under ``key``.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not (retry and job.status == FAILED) and not job.stale:
+                return job
+
+            job = Job(key, description, cache)
+            self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            self._prune()
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started = time.time()
+        job.message = 'Running'
+        try:
+            result = fn(*args, progress=job.report, **kwargs)
+            if job.cache is None:
+                job._result = result
+            job.status = DONE
+            job.report(1.0, 'Done')
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+            job.message = f'Failed: {e}'
+        finally:
+            job.finished = time.time()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond ``max_jobs``."""
+        excess = len(self._jobs) - self.max_jobs
+        for key in [key for key, job in self._jobs.items() if job.done][:max(excess, 0)]:
+            del self._jobs[key]
+
+    def jobs(self):
+        return list(self._jobs.values())
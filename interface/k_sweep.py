@@ -0,0 +1,101 @@
+"""R² sweep over the number of clusters (the notebook's elbow analysis).
+
+Replaces ``get_r2_scores``: sums of squares come from ``np.bincount`` over a
+label array instead of ``groupby(labels).apply(get_ss)``, every hierarchical
+linkage builds its tree once and cuts it at every k, and the K-means fits for
+the different k run in parallel worker processes. Above ``max_tree_size`` rows
+the trees are built on weighted micro-clusters (see ``hierarchy``).
+"""
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.cluster.hierarchy import cut_tree, linkage
+from sklearn.cluster import KMeans
+
+import hierarchy
+
+LINKAGES = ['complete', 'average', 'single', 'ward']
+METHODS = ['kmeans'] + LINKAGES
+
+
+def total_ss(X):
+    """Total sum of squares (SST) of all variables."""
+    X = np.asarray(X, dtype=float)
+    return float(((X - X.mean(axis=0)) ** 2).sum())
+
+
+def within_ss(X, labels):
+    """Within-cluster sum of squares (SSW) for one label array.
+
+    Uses SSW = sum(x²) - sum_k |S_k|² / n_k with S_k the per-cluster sums, so
+    it is a handful of bincounts regardless of the number of clusters.
+    """
+    X = np.asarray(X, dtype=float)
+    X = X - X.mean(axis=0)  # centring keeps the subtraction numerically stable
+    _, codes = np.unique(labels, return_inverse=True)
+    counts = np.bincount(codes)
+    between = 0.0
+    for j in range(X.shape[1]):
+        sums = np.bincount(codes, weights=X[:, j])
+        between += (sums ** 2 / counts).sum()
+    return float((X ** 2).sum() - between)
+
+
+def r2(X, labels, sst=None):
+    """R² of a clustering: 1 - SSW / SST."""
+    if sst is None:
+        sst = total_ss(X)
+    return 1 - within_ss(X, labels) / sst
+
+
+def _kmeans_labels(X, k, n_init, random_state):
+    return KMeans(n_clusters=k, init='k-means++', n_init=n_init, random_state=random_state).fit_predict(X)
+
+
+def kmeans_labels(X, ks, n_init=20, random_state=42, n_jobs=-1):
+    """K-means labels for every k, fitted in parallel worker processes."""
+    labels = Parallel(n_jobs=n_jobs)(delayed(_kmeans_labels)(X, k, n_init, random_state) for k in ks)
+    return dict(zip(ks, labels))
+
+
+def hierarchical_labels(X, method, ks, max_tree_size=10000, n_micro=hierarchy.N_MICRO, random_state=42):
+    """Labels for every k from a single hierarchical tree.
+
+    The tree is built once and cut at each k. Above ``max_tree_size`` rows
+    (the condensed distance matrix grows quadratically) it is built on
+    ``n_micro`` micro-clusters and every row takes the label of its
+    micro-cluster.
+    """
+    X = np.asarray(X, dtype=float)
+    if len(X) > max_tree_size:
+        return hierarchy.Hierarchy.fit(X, method=method, n_micro=n_micro, random_state=random_state).labels(ks)
+
+    Z = linkage(X, method=method, metric='euclidean')
+    cuts = cut_tree(Z, n_clusters=list(ks))
+    return {k: cuts[:, position] for position, k in enumerate(ks)}
+
+
+def r2_sweep(X, methods=METHODS, min_k=2, max_k=10, n_init=20, random_state=42,
+             n_jobs=-1, max_tree_size=10000, progress=None):
+    """R² for every method and every k in ``range(min_k, max_k)``.
+
+    Returns a DataFrame indexed by the number of clusters with one column per
+    method, the same layout as ``pd.DataFrame(r2_scores)`` in the notebook.
+    """
+    X = np.asarray(X, dtype=float)
+    ks = list(range(min_k, max_k))
+    sst = total_ss(X)
+
+    scores = {}
+    for step, method in enumerate(methods):
+        if progress is not None:
+            progress(step / len(methods), f'Fitting {method}')
+        if method == 'kmeans':
+            labels = kmeans_labels(X, ks, n_init=n_init, random_state=random_state, n_jobs=n_jobs)
+        else:
+            labels = hierarchical_labels(X, method, ks, max_tree_size=max_tree_size, random_state=random_state)
+        scores[method] = {k: r2(X, labels[k], sst) for k in ks}
+
+    frame = pd.DataFrame(scores)
+    frame.index.name = 'n_clusters'
+    return frame
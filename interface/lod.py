@@ -0,0 +1,90 @@
+"""Level-of-detail reduction for the 3D customer scatter.
+
+The browser renders every point it receives as a WebGL marker with its own
+hover data, so large selections are reduced on the server before plotting:
+either by a cluster-stratified sample or by aggregating points into voxels.
+"""
+import numpy as np
+
+
+def stratified_sample(labels, budget, min_per_stratum=200, seed=42):
+    """Positions of a sample of about ``budget`` rows, stratified by label.
+
+    Every stratum keeps its share of the budget, but never less than
+    ``min_per_stratum`` rows (or all its rows if it is smaller), so small
+    clusters stay visible. Without the floor the sample has exactly
+    ``budget`` rows; because of it the result can exceed the budget by at
+    most ``min_per_stratum`` rows per stratum. The sample is
+    seeded, so reruns with the same inputs draw the same points.
+    """
+    labels = np.asarray(labels)
+    n = len(labels)
+    if n <= budget:
+        return np.arange(n)
+
+    order = np.argsort(labels, kind='stable')
+    _, starts, counts = np.unique(labels[order], return_index=True, return_counts=True)
+
+    # Largest-remainder rounding: the proportional shares sum exactly to the budget
+    shares = budget * counts / n
+    quotas = np.floor(shares).astype(int)
+    remainders = shares - quotas
+    quotas[np.argsort(-remainders, kind='stable')[:budget - quotas.sum()]] += 1
+
+    floor = min(min_per_stratum, budget // len(counts))
+    quotas = np.minimum(counts, np.maximum(floor, quotas))
+
+    rng = np.random.default_rng(seed)
+    picked = [
+        order[start + rng.choice(count, size=quota, replace=False)]
+        for start, count, quota in zip(starts, counts, quotas)
+    ]
+    return np.sort(np.concatenate(picked))
+
+
+def voxel_aggregate(coords, labels, resolution=24, values=None):
+    """Aggregate points into a regular grid of voxels, one group per label.
+
+    Returns a dict with the mean position of the points of each
+    (voxel, label) group (``centers``), their ``counts`` and ``labels`` and,
+    if ``values`` is given, the mean value of each group (e.g. the mean age
+    when colouring by a continuous variable).
+    """
+    coords = np.asarray(coords, dtype=float)
+    labels = np.asarray(labels)
+
+    lo = coords.min(axis=0)
+    span = coords.max(axis=0) - lo
+    span[span == 0] = 1.0
+    cells = np.minimum(((coords - lo) / span * resolution).astype(np.int64), resolution - 1)
+    voxel_id = (cells[:, 0] * resolution + cells[:, 1]) * resolution + cells[:, 2]
+
+    label_values, label_codes = np.unique(labels, return_inverse=True)
+    keys = voxel_id * len(label_values) + label_codes
+    _, first, groups = np.unique(keys, return_index=True, return_inverse=True)
+
+    counts = np.bincount(groups)
+    centers = np.column_stack([
+        np.bincount(groups, weights=coords[:, axis]) / counts for axis in range(coords.shape[1])
+    ])
+    result = {'centers': centers, 'counts': counts, 'labels': labels[first]}
+    if values is not None:
+        result['values'] = np.bincount(groups, weights=np.asarray(values, dtype=float)) / counts
+    return result
+
+
+def density_sizes(counts, min_size=2.0, max_size=14.0):
+    """Marker sizes growing with the log of the number of points per voxel."""
+    weight = np.log1p(counts)
+    top = weight.max()
+    if top == 0:
+        return np.full(len(counts), min_size)
+    return min_size + (max_size - min_size) * weight / top
+
+
+def within_bounds(columns, bounds):
+    """Boolean mask of rows whose values fall inside every (lo, hi) bound."""
+    mask = np.ones(len(columns[0]), dtype=bool)
+    for values, (lo, hi) in zip(columns, bounds):
+        mask &= (values >= lo) & (values <= hi)
+    return mask
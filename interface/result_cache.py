@@ -0,0 +1,94 @@
+"""Disk-backed cache for computed results with LRU eviction.
+
+Entries are pickled into one file each, named after a hash of the key parts
+(e.g. feature set, algorithm, parameters and data version). Reading an entry
+refreshes its modification time, and the least recently used entries are
+removed once the cache grows past its entry or size limits.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+from data_store import CACHE_DIR, atomic_save
+
+RESULTS_DIR = os.path.join(CACHE_DIR, 'results')
+
+
+def make_key(*parts):
+    """Stable hex key for any JSON-serialisable combination of parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """Pickle files under ``directory`` with LRU eviction."""
+
+    def __init__(self, directory=RESULTS_DIR, max_entries=256, max_bytes=1 << 30):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key, default=None):
+        """Cached value for ``key``, or ``default`` if missing or unreadable."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        """Store ``value`` under ``key`` and evict old entries if needed."""
+        atomic_save(self._path(key), lambda f: pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Cached value for ``key``, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def evict(self):
+        """Remove least recently used entries beyond the configured limits."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith('.pkl'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+            entries.sort(reverse=True)
+            total = 0
+            for position, (_, size, name) in enumerate(entries):
+                total += size
+                if position >= self.max_entries or total > self.max_bytes:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,225 @@
+"""Assign new customers to the demographic, purchase behavior and merged clusters.
+
+The pipeline is built from ``standard_scaler.pkl`` and the labelled customers in
+``customer_id_merged.pkl``: the centroid of each segment cluster is the mean of
+its (scaled) members, which is what the notebook's fitted K-means models
+converged to, and ``cluster_mapper`` becomes a lookup table indexed by
+(demographics label, purchase behavior label). Scoring is plain array work:
+scale, nearest centroid per segment, table lookup. Files are processed in
+fixed-size chunks so memory stays bounded whatever the input size.
+
+Usage::
+
+    python interface/scoring.py new_customers.csv scored.csv --chunk-size 100000
+"""
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_store import CACHE_DIR, atomic_save
+
+SCALER_FILE = 'standard_scaler.pkl'
+LABELLED_FILE = 'customer_id_merged.pkl'
+PIPELINE_FILE = os.path.join(CACHE_DIR, 'scoring_pipeline.npz')
+
+SEGMENTS = {
+    'demographics_labels': ['customer_age', 'Recency', 'log_order_rate_per_week', 'log_amount_spent_per_week'],
+    'purchase_behavior_labels': ['average_product_price', 'chain_percentage', 'log_vendor_count'],
+}
+MERGED_LABEL = 'merged_labels'
+
+
+class ScoringStats:
+    """Throughput counters of one scoring run."""
+
+    def __init__(self):
+        self.rows = 0
+        self.chunks = 0
+        self.seconds = 0.0  # time spent labelling
+        self.wall_seconds = 0.0  # including reading and writing files
+        self.label_counts = {}
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def add(self, labels, seconds):
+        self.rows += len(labels)
+        self.chunks += 1
+        self.seconds += seconds
+        values, counts = np.unique(labels, return_counts=True)
+        for value, count in zip(values.tolist(), counts.tolist()):
+            self.label_counts[value] = self.label_counts.get(value, 0) + count
+
+    def __repr__(self):
+        return (f'ScoringStats(rows={self.rows}, chunks={self.chunks}, seconds={self.seconds:.3f}, '
+                f'wall_seconds={self.wall_seconds:.3f}, rows_per_second={self.rows_per_second:,.0f})')
+
+
+class ScoringPipeline:
+    """Scaler, segment centroids and merged-cluster lookup table as plain arrays."""
+
+    def __init__(self, feature_names, mean, scale, centroids, lookup):
+        self.feature_names = list(feature_names)
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        # segment label column -> (positions of its features, centroids)
+        self.segments = {
+            segment: (np.array([self.feature_names.index(f) for f in SEGMENTS[segment]]), np.asarray(c, dtype=float))
+            for segment, c in centroids.items()
+        }
+        self.lookup = np.asarray(lookup)
+
+    def transform(self, X):
+        """Standardise raw (unscaled) feature values."""
+        return (np.asarray(X, dtype=float) - self.mean) / self.scale
+
+    def score_array(self, X, scaled=False):
+        """Labels of every row of a (n, n_features) array in ``feature_names`` order."""
+        Z = np.asarray(X, dtype=float) if scaled else self.transform(X)
+        labels = {}
+        for segment, (columns, centroids) in self.segments.items():
+            # argmin |z - c|² = argmin (|c|² - 2 z.c), the |z|² term is common to all centroids
+            distances = (centroids ** 2).sum(axis=1) - 2 * Z[:, columns] @ centroids.T
+            labels[segment] = distances.argmin(axis=1)
+        labels[MERGED_LABEL] = self.lookup[
+            labels['demographics_labels'], labels['purchase_behavior_labels']
+        ]
+        return labels
+
+    def score_frame(self, df, scaled=False):
+        """DataFrame of the three label columns for ``df`` (same index)."""
+        labels = self.score_array(df[self.feature_names].to_numpy(), scaled=scaled)
+        return pd.DataFrame(labels, index=df.index)
+
+    def score_chunks(self, chunks, stats=None, scaled=False):
+        """Label an iterable of DataFrames, yielding each chunk with its labels appended."""
+        for chunk in chunks:
+            start = time.perf_counter()
+            labels = self.score_array(chunk[self.feature_names].to_numpy(), scaled=scaled)
+            # Assigned by position (indexes of file chunks may repeat); existing labels are replaced
+            labelled = chunk.drop(columns=list(labels), errors='ignore').assign(**labels)
+            if stats is not None:
+                stats.add(labelled[MERGED_LABEL].to_numpy(), time.perf_counter() - start)
+            yield labelled
+
+    def score_file(self, input_path, output_path, chunk_size=100000, scaled=False):
+        """Score a CSV or Parquet file chunk by chunk into a CSV or Parquet file."""
+        stats = ScoringStats()
+        start = time.perf_counter()
+        chunks = self.score_chunks(read_chunks(input_path, chunk_size), stats, scaled=scaled)
+        write_chunks(chunks, output_path)
+        stats.wall_seconds = time.perf_counter() - start
+        return stats
+
+    def save(self, path=PIPELINE_FILE):
+        """Persist the arrays of the pipeline (no pickled objects) to an ``.npz`` file.
+
+        The file is replaced atomically, as sessions may be loading it.
+        """
+        arrays = {f'centroids__{segment}': centroids for segment, (_, centroids) in self.segments.items()}
+        return atomic_save(path, lambda f: np.savez(
+            f,
+            feature_names=np.array(self.feature_names),
+            mean=self.mean,
+            scale=self.scale,
+            lookup=self.lookup,
+            **arrays
+        ))
+
+    @classmethod
+    def load(cls, path=PIPELINE_FILE):
+        with np.load(path) as data:
+            centroids = {
+                name.split('__', 1)[1]: data[name] for name in data.files if name.startswith('centroids__')
+            }
+            return cls(data['feature_names'].tolist(), data['mean'], data['scale'], centroids, data['lookup'])
+
+
+def build_pipeline(scaler_path=SCALER_FILE, labelled_path=LABELLED_FILE):
+    """Build the pipeline from the exported scaler and labelled customers."""
+    with open(scaler_path, 'rb') as f:
+        scaler = pickle.load(f)
+    with open(labelled_path, 'rb') as f:
+        labelled = pickle.load(f)
+
+    centroids = {
+        segment: labelled.groupby(segment)[features].mean().sort_index().to_numpy()
+        for segment, features in SEGMENTS.items()
+    }
+
+    # cluster_mapper as a table: every (demographic, purchase) pair maps to one merged label
+    pairs = labelled.groupby(list(SEGMENTS))[MERGED_LABEL].agg(lambda labels: labels.mode().iloc[0])
+    lookup = np.full([len(c) for c in centroids.values()], -1, dtype=np.int64)
+    for (demographic, purchase), merged in pairs.items():
+        lookup[demographic, purchase] = merged
+
+    return ScoringPipeline(scaler.feature_names_in_, scaler.mean_, scaler.scale_, centroids, lookup)
+
+
+def ensure_pipeline(path=PIPELINE_FILE):
+    """Path of the persisted pipeline, building and saving it on first use."""
+    if not os.path.exists(path):
+        build_pipeline().save(path)
+    return path
+
+
+def load_pipeline(path=PIPELINE_FILE):
+    """Load the persisted pipeline, building and saving it on first use."""
+    return ScoringPipeline.load(ensure_pipeline(path))
+
+
+def read_chunks(path, chunk_size):
+    """Iterate over a CSV or Parquet file in DataFrames of ``chunk_size`` rows."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def write_chunks(chunks, path):
+    """Write labelled chunks to a CSV or Parquet file as they arrive."""
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        for position, chunk in enumerate(chunks):
+            chunk.to_csv(path, mode='w' if position == 0 else 'a', header=position == 0, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assign customers to the merged clusters.')
+    parser.add_argument('input', help='CSV or Parquet file with the unscaled customer features')
+    parser.add_argument('output', help='CSV or Parquet file to write the labelled customers to')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--scaled', action='store_true', help='the input features are already standardised')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the pipeline from the exported files')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        build_pipeline().save()
+    stats = load_pipeline().score_file(args.input, args.output, chunk_size=args.chunk_size, scaled=args.scaled)
+    print(stats)
+    print('Customers per merged cluster:', stats.label_counts)
+
+
+if __name__ == '__main__':
+    main()
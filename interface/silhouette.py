@@ -0,0 +1,149 @@
+"""Silhouette scores without the full pairwise distance matrix.
+
+``silhouette_score`` needs the distances between every pair of customers. Here
+the rows are processed in chunks sized to a memory budget, spread over
+worker processes: each chunk computes its distances to all the customers,
+reduces them to a sum per cluster and is discarded, so memory stays at
+``working_memory`` per worker whatever the number of customers.
+
+For quick answers, ``estimate_silhouette`` evaluates exact silhouettes for a
+cluster-stratified sample of customers (against all the customers, not only
+the sample) and returns the stratified mean with a confidence interval, per
+cluster and overall.
+"""
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.stats import norm
+from sklearn.metrics.pairwise import euclidean_distances
+
+import lod
+
+
+def _rows_silhouette(X, counts, starts, codes, rows):
+    """Silhouettes of ``rows`` of ``X`` (sorted by cluster code) against every row."""
+    distances = euclidean_distances(X[rows], X)
+    # Rows of X are grouped by cluster, so reduceat gives the distance sum per cluster
+    sums = np.add.reduceat(distances, starts, axis=1)
+    own = codes[rows]
+    n_own = counts[own]
+
+    a = sums[np.arange(len(rows)), own] / np.maximum(n_own - 1, 1)
+    means = sums / counts
+    means[np.arange(len(rows)), own] = np.inf
+    b = means.min(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = np.nan_to_num((b - a) / np.maximum(a, b))
+    # As in scikit-learn, members of singleton clusters score 0
+    values[n_own == 1] = 0.0
+    return values
+
+
+def _prepare(X, labels):
+    """Rows sorted by cluster with the per-cluster sizes and starting positions."""
+    X = np.asarray(X, dtype=float)
+    values, codes = np.unique(np.asarray(labels), return_inverse=True)
+    if not 2 <= len(values) <= len(X) - 1:
+        raise ValueError(f'Number of labels is {len(values)}. Valid values are 2 to n_samples - 1 (inclusive)')
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return X[order], codes[order], order, values, counts, starts
+
+
+def _chunk_rows(n, working_memory):
+    """Rows per chunk so that a chunk's distance matrix fits in ``working_memory`` MiB."""
+    return max(1, int(working_memory * 2 ** 20 // (8 * n)))
+
+
+def _evaluate(X, codes, counts, starts, rows, working_memory, n_jobs, progress):
+    chunk = _chunk_rows(len(X), working_memory)
+    chunks = [rows[start:start + chunk] for start in range(0, len(rows), chunk)]
+    tasks = (delayed(_rows_silhouette)(X, counts, starts, codes, positions) for positions in chunks)
+
+    values = []
+    for done, chunk_values in enumerate(Parallel(n_jobs=n_jobs, return_as='generator')(tasks), start=1):
+        values.append(chunk_values)
+        if progress is not None:
+            progress(done / len(chunks), f'Chunk {done}/{len(chunks)}')
+    return np.concatenate(values)
+
+
+def silhouette_samples(X, labels, working_memory=64, n_jobs=-1, progress=None):
+    """Exact silhouette of every row, the same values as scikit-learn's ``silhouette_samples``."""
+    X_sorted, codes, order, _, counts, starts = _prepare(X, labels)
+    values = _evaluate(X_sorted, codes, counts, starts, np.arange(len(X_sorted)), working_memory, n_jobs, progress)
+    result = np.empty(len(values))
+    result[order] = values
+    return result
+
+
+def summarise(labels, rows, values, confidence=0.95):
+    """Overall and per-cluster silhouette from the values of some or all rows.
+
+    ``rows`` are the positions the ``values`` belong to. When they are a
+    sample, means are the stratified (by cluster) estimates and the bounds
+    their normal confidence interval with finite population correction; when
+    every row is included the bounds collapse onto the exact mean.
+    """
+    labels = np.asarray(labels)
+    clusters, sizes = np.unique(labels, return_counts=True)
+    sampled_labels = labels[rows]
+    z = norm.ppf((1 + confidence) / 2)
+
+    records = []
+    for cluster, size in zip(clusters, sizes):
+        cluster_values = values[sampled_labels == cluster]
+        n = len(cluster_values)
+        variance = cluster_values.var(ddof=1) if n > 1 else 0.0
+        standard_error = np.sqrt((1 - n / size) * variance / n)
+        records.append({
+            'cluster': cluster,
+            'size': int(size),
+            'evaluated': n,
+            'mean': cluster_values.mean(),
+            'standard_error': standard_error,
+            'lower': cluster_values.mean() - z * standard_error,
+            'upper': cluster_values.mean() + z * standard_error,
+            'median': np.median(cluster_values),
+            'min': cluster_values.min(),
+            'negative_share': (cluster_values < 0).mean(),
+        })
+    summary = pd.DataFrame(records).set_index('cluster')
+
+    weights = summary['size'] / summary['size'].sum()
+    score = float((weights * summary['mean']).sum())
+    standard_error = float(np.sqrt((weights ** 2 * summary['standard_error'] ** 2).sum()))
+    return {
+        'score': score,
+        'lower': score - z * standard_error,
+        'upper': score + z * standard_error,
+        'exact': len(rows) == len(labels),
+        'rows': np.asarray(rows),
+        'values': np.asarray(values),
+        'summary': summary.drop(columns='standard_error'),
+    }
+
+
+def silhouette(X, labels, working_memory=64, n_jobs=-1, confidence=0.95, progress=None):
+    """Exact silhouette score with the per-cluster summary (see ``summarise``)."""
+    values = silhouette_samples(X, labels, working_memory=working_memory, n_jobs=n_jobs, progress=progress)
+    return summarise(labels, np.arange(len(values)), values, confidence)
+
+
+def estimate_silhouette(X, labels, sample_size=5000, min_per_cluster=30, confidence=0.95,
+                        random_state=42, working_memory=64, n_jobs=-1, progress=None):
+    """Silhouette score estimated from a cluster-stratified sample of rows.
+
+    Each sampled row gets its exact silhouette (distances to every row), so
+    the only error is sampling error, which the confidence interval covers.
+    Small clusters keep at least ``min_per_cluster`` rows.
+    """
+    labels = np.asarray(labels)
+    X_sorted, codes, order, _, counts, starts = _prepare(X, labels)
+    rows = lod.stratified_sample(labels, sample_size, min_per_stratum=min_per_cluster, seed=random_state)
+
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+    values = _evaluate(X_sorted, codes, counts, starts, position[rows], working_memory, n_jobs, progress)
+    return summarise(labels, rows, values, confidence)
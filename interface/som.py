@@ -0,0 +1,172 @@
+"""Batch self-organising map on a hexagonal lattice.
+
+A NumPy replacement for the ``sompy`` maps of the notebook
+(``mapsize=[10, 10]``, random initialisation, Gaussian neighbourhood, batch
+training with 120 rough and 120 fine-tuning epochs). Every epoch is one
+blocked best-matching-unit (BMU) search spread over threads, followed by
+the batch update: each node moves to the neighbourhood-weighted mean of the
+data, computed from per-node sums and counts.
+
+Trained codebooks are saved under ``.cache/som`` keyed by the data and the
+training parameters, so the SOM + K-means and SOM + Hierarchical stages
+share one map instead of training their own.
+"""
+import hashlib
+import os
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.neighbors import KDTree
+
+from data_store import CACHE_DIR, atomic_save
+
+SOM_DIR = os.path.join(CACHE_DIR, 'som')
+
+# sompy's radius schedule for a randomly initialised map: (start, end) of
+# each phase as divisors of the map size and of the start radius
+ROUGH_RADIUS = (3, 6)
+FINETUNE_RADIUS = (12, 25)
+
+
+def hex_coordinates(rows, cols):
+    """Positions of the nodes of a hexagonal lattice (odd rows shifted by half a node)."""
+    r, c = np.divmod(np.arange(rows * cols), cols)
+    return np.column_stack([c + 0.5 * (r % 2), r * np.sqrt(3) / 2])
+
+
+def _block_bmus(X, codebook, codebook_sq):
+    # argmin |x - c|² = argmin (|c|² - 2 x.c)
+    scores = codebook_sq - 2 * X @ codebook.T
+    bmus = scores.argmin(axis=1)
+    distances = np.sqrt(np.maximum(scores[np.arange(len(X)), bmus] + (X ** 2).sum(axis=1), 0))
+    return bmus, distances
+
+
+def _blocks(n, block_size):
+    return [slice(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+
+
+class SOM:
+    """Self-organising map with a hexagonal lattice and a Gaussian neighbourhood."""
+
+    def __init__(self, mapsize=(10, 10), random_state=80, block_size=8192, n_jobs=-1):
+        self.mapsize = tuple(mapsize)
+        self.random_state = random_state
+        self.block_size = block_size
+        self.n_jobs = n_jobs
+        self.codebook = None
+        self._index = None
+
+        coordinates = hex_coordinates(*self.mapsize)
+        self.lattice_distances = ((coordinates[:, None, :] - coordinates[None, :, :]) ** 2).sum(axis=2)
+
+    @property
+    def n_nodes(self):
+        return self.mapsize[0] * self.mapsize[1]
+
+    def _initialise(self, X):
+        """Random codebook drawn uniformly between the minimum and maximum of each feature."""
+        rng = np.random.default_rng(self.random_state)
+        lo, hi = X.min(axis=0), X.max(axis=0)
+        return lo + rng.random((self.n_nodes, X.shape[1])) * (hi - lo)
+
+    def _bmus(self, X, codebook):
+        """BMU and its distance for every row, by blocks of rows in parallel threads."""
+        codebook_sq = (codebook ** 2).sum(axis=1)
+        results = Parallel(n_jobs=self.n_jobs, prefer='threads')(
+            delayed(_block_bmus)(X[block], codebook, codebook_sq) for block in _blocks(len(X), self.block_size)
+        )
+        return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+    def _epochs(self, X, codebook, radii, progress=None, done=0, total=None):
+        for epoch, radius in enumerate(radii, start=1):
+            bmus, _ = self._bmus(X, codebook)
+            counts = np.bincount(bmus, minlength=self.n_nodes).astype(float)
+            sums = np.column_stack([np.bincount(bmus, X[:, j], self.n_nodes) for j in range(X.shape[1])])
+
+            neighbourhood = np.exp(-self.lattice_distances / (2 * radius ** 2))
+            weights = neighbourhood @ counts
+            # Nodes without data anywhere in their neighbourhood keep their position
+            update = weights > 0
+            codebook = codebook.copy()
+            codebook[update] = (neighbourhood @ sums)[update] / weights[update, None]
+            if progress is not None:
+                progress((done + epoch) / total, f'Epoch {done + epoch}/{total} (radius {radius:.2f})')
+        return codebook
+
+    def train(self, X, rough_len=120, finetune_len=120, progress=None):
+        """Rough then fine-tuning batch training, with sompy's radius schedule."""
+        X = np.asarray(X, dtype=float)
+        size = max(self.mapsize)
+        rough_start = max(1.0, np.ceil(size / ROUGH_RADIUS[0]))
+        rough_end = max(1.0, rough_start / ROUGH_RADIUS[1])
+        finetune_start = max(1.0, size / FINETUNE_RADIUS[0])
+        finetune_end = max(1.0, finetune_start / FINETUNE_RADIUS[1])
+
+        total = rough_len + finetune_len
+        codebook = self._initialise(X)
+        codebook = self._epochs(X, codebook, np.linspace(rough_start, rough_end, rough_len), progress, 0, total)
+        codebook = self._epochs(
+            X, codebook, np.linspace(finetune_start, finetune_end, finetune_len), progress, rough_len, total
+        )
+        self.codebook = codebook
+        self._index = None
+        return self
+
+    @property
+    def index(self):
+        """KD-tree over the codebook, built on first use."""
+        if self._index is None:
+            self._index = KDTree(self.codebook)
+        return self._index
+
+    def find_bmu(self, X):
+        """BMU of every row and its distance, as ``(bmus, distances)``.
+
+        Large batches are queried against the codebook index by blocks in
+        parallel threads.
+        """
+        X = np.asarray(X, dtype=float)
+        results = Parallel(n_jobs=self.n_jobs, prefer='threads')(
+            delayed(self.index.query)(X[block], k=1) for block in _blocks(len(X), self.block_size)
+        )
+        distances = np.concatenate([r[0][:, 0] for r in results])
+        bmus = np.concatenate([r[1][:, 0] for r in results])
+        return bmus, distances
+
+    def quantization_error(self, X):
+        return float(self.find_bmu(X)[1].mean())
+
+    def hits(self, X):
+        """Number of rows mapped to each node."""
+        return np.bincount(self.find_bmu(X)[0], minlength=self.n_nodes)
+
+    def save(self, path):
+        """Write the codebook to an ``.npz`` file (atomically, maps may be trained concurrently)."""
+        return atomic_save(path, lambda f: np.savez(
+            f, codebook=self.codebook, mapsize=np.array(self.mapsize), random_state=self.random_state
+        ))
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with np.load(path) as data:
+            som = cls(mapsize=data['mapsize'].tolist(), random_state=int(data['random_state']), **kwargs)
+            som.codebook = data['codebook']
+        return som
+
+
+def codebook_path(X, mapsize, random_state, rough_len, finetune_len):
+    digest = hashlib.sha1(np.ascontiguousarray(X, dtype=float).tobytes())
+    digest.update(repr((tuple(mapsize), random_state, rough_len, finetune_len)).encode())
+    return os.path.join(SOM_DIR, f'{digest.hexdigest()}.npz')
+
+
+def trained_som(X, mapsize=(10, 10), random_state=80, rough_len=120, finetune_len=120, progress=None):
+    """SOM trained on ``X``, loaded from disk when the same map was trained before."""
+    X = np.asarray(X, dtype=float)
+    path = codebook_path(X, mapsize, random_state, rough_len, finetune_len)
+    if os.path.exists(path):
+        return SOM.load(path)
+    som = SOM(mapsize=mapsize, random_state=random_state).train(X, rough_len, finetune_len, progress=progress)
+    som.save(path)
+    return som
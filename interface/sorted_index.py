@@ -0,0 +1,77 @@
+"""Sort-order indexes for range filtering on the customer store.
+
+Each filterable column gets its argsort (``order``), the inverse
+permutation (``rank``) and its values in sorted order, saved next to the
+columnar store and memory mapped. A range query is then two binary searches returning a slice of ``order``,
+and several range filters are combined by checking ranks of the smallest
+candidate set instead of building boolean masks over the whole table.
+"""
+import os
+
+import numpy as np
+
+from data_store import atomic_save
+
+
+class SortedColumnIndex:
+    """Sorted view over one column of a ``data_store.ColumnStore``."""
+
+    def __init__(self, store, column):
+        self.column = column
+        paths = {
+            part: os.path.join(store.directory, f'sorted_{column}.{part}.npy')
+            for part in ['order', 'rank', 'values']
+        }
+
+        if not all(os.path.exists(path) for path in paths.values()):
+            values = store.column(column)
+            order = np.argsort(values, kind='stable')
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+            arrays = {'order': order, 'rank': rank, 'values': np.asarray(values)[order]}
+            for part, path in paths.items():
+                atomic_save(path, lambda f, part=part: np.save(f, arrays[part]))
+
+        self.order = np.load(paths['order'], mmap_mode='r')
+        self.rank = np.load(paths['rank'], mmap_mode='r')
+        self.sorted_values = np.load(paths['values'], mmap_mode='r')
+
+    def bounds(self, lo, hi):
+        """Positions in sort order covering ``lo <= value <= hi``."""
+        start = np.searchsorted(self.sorted_values, lo, side='left')
+        stop = np.searchsorted(self.sorted_values, hi, side='right')
+        return start, stop
+
+    def range(self, lo, hi):
+        """Row positions with ``lo <= value <= hi`` (a view, in value order)."""
+        start, stop = self.bounds(lo, hi)
+        return self.order[start:stop]
+
+    def count(self, lo, hi):
+        start, stop = self.bounds(lo, hi)
+        return stop - start
+
+
+def select_rows(indexes, ranges):
+    """Row positions satisfying every ``column -> (lo, hi)`` range.
+
+    The most selective filter provides the candidates; the other filters are
+    applied by comparing the candidates' ranks with the bounds of each range,
+    so no column values or frame copies are touched. Positions are returned
+    in ascending row order. Without any range ``None`` is returned, meaning
+    all rows.
+    """
+    if not ranges:
+        return None
+
+    bounds = {column: indexes[column].bounds(lo, hi) for column, (lo, hi) in ranges.items()}
+    driver = min(bounds, key=lambda column: bounds[column][1] - bounds[column][0])
+    start, stop = bounds[driver]
+    rows = indexes[driver].order[start:stop]
+
+    for column, (start, stop) in bounds.items():
+        if column == driver or len(rows) == 0:
+            continue
+        ranks = indexes[column].rank[rows]
+        rows = rows[(ranks >= start) & (ranks < stop)]
+    return np.sort(rows)
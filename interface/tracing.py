@@ -0,0 +1,123 @@
+"""Timing spans and counters for every rerun of the interface.
+
+Each rerun of the script gets a ``RerunTrace``: stages are wrapped in
+``trace.span(name)`` and payload sizes are added with ``trace.add``. When
+the rerun ends, the trace records its total time and the resident memory of
+the whole server process (not of the session), and is written as one JSON
+line to a size-rotated trace file, so hot paths can be found from the
+reruns of every session under real load.
+
+Set ``INTERFACE_TRACE_FILE`` to change where traces are written, or to an
+empty string to turn the file off.
+"""
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+from data_store import CACHE_DIR
+
+TRACE_FILE = os.environ.get('INTERFACE_TRACE_FILE', os.path.join(CACHE_DIR, 'traces', 'reruns.jsonl'))
+MAX_BYTES = 5 * 2 ** 20
+BACKUP_COUNT = 5
+
+
+def memory_usage():
+    """Resident memory of the whole process in MiB.
+
+    Falls back to the peak resident memory where /proc is unavailable
+    (macOS), and to ``None`` where neither is (Windows).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class RerunTrace:
+    """Spans and counters of one rerun of the script."""
+
+    def __init__(self, session_id, page):
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.page = page
+        self.started_at = time.time()
+        self.spans = []  # (name, depth, start, seconds) in start order
+        self.counters = {}
+        self.status = 'running'
+        self.seconds = None
+        self.memory_mb = None  # of the whole server process, shared by every session
+        self._start = time.perf_counter()
+        self._depth = 0
+
+    @contextmanager
+    def span(self, name):
+        """Time the enclosed block; nested spans are recorded with their depth."""
+        start = time.perf_counter()
+        position = len(self.spans)
+        self.spans.append([name, self._depth, start - self._start, None])
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.spans[position][3] = time.perf_counter() - start
+
+    def add(self, counter, value):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def finish(self, status='done'):
+        if self.status != 'running':
+            return self
+        self.status = status
+        self.seconds = time.perf_counter() - self._start
+        self.memory_mb = memory_usage()
+        return self
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'session': self.session_id,
+            'page': self.page,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+            'status': self.status,
+            'seconds': None if self.seconds is None else round(self.seconds, 4),
+            'memory_mb': None if self.memory_mb is None else round(self.memory_mb, 1),
+            'spans': [
+                {'name': name, 'depth': depth, 'start': round(start, 4), 'seconds': None if s is None else round(s, 4)}
+                for name, depth, start, s in self.spans
+            ],
+            'counters': self.counters,
+        }
+
+
+class TraceSink:
+    """Writes finished traces as JSON lines to a size-rotated file."""
+
+    def __init__(self, path=TRACE_FILE, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        self.path = path
+        self.logger = logging.getLogger(f'interface.trace.{id(self)}')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def write(self, trace):
+        if self.path:
+            self.logger.info(json.dumps(trace.as_dict()))
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The interface modules import each other as top-level modules, as when the app runs
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'interface'))
+
+import data_store  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def customer_store(tmp_path_factory):
+    """Small columnar store with the label, age and feature columns of the customer table."""
+    rng = np.random.default_rng(0)
+    n = 3000
+    df = pd.DataFrame({
+        'customer_age': rng.integers(15, 81, size=n).astype(float),
+        'Recency': rng.uniform(0, 90, size=n),
+        'chain_percentage': rng.uniform(0, 1, size=n),
+        'log_order_rate_per_week': rng.normal(size=n),
+        'demographics_labels': rng.integers(0, 4, size=n),
+        'purchase_behavior_labels': rng.integers(0, 5, size=n),
+    })
+    df['merged_labels'] = (df['demographics_labels'] + df['purchase_behavior_labels']) % 3
+    df.index = pd.Index([f'{i:06x}' for i in range(n)], name='customer_id')
+
+    directory = tmp_path_factory.mktemp('store')
+    source = directory / 'customers.pkl'
+    df.to_pickle(source)
+    return data_store.ColumnStore(data_store.build_store(str(source), 'test', str(directory / 'columnar')))
@@ -0,0 +1,62 @@
+"""Cluster profiles of ``cube`` against pandas on the rows of the store."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import cube
+
+FEATURES = ['customer_age', 'Recency', 'chain_percentage', 'log_order_rate_per_week']
+
+
+@pytest.fixture(scope='module')
+def aggregates(customer_store):
+    return cube.AggregateCube(customer_store, FEATURES)
+
+
+@pytest.fixture(scope='module')
+def frame(customer_store):
+    return customer_store.frame(FEATURES + cube.LABEL_COLUMNS)
+
+
+def expected_profile(df, by):
+    stats = df.groupby(by)[FEATURES].agg(['mean', 'var', 'size'])
+    sizes = stats.xs('size', axis=1, level=1).iloc[:, 0]
+    # pandas' variance is the sample variance (ddof=1), the cube's the population one
+    variances = stats.xs('var', axis=1, level=1).mul((sizes - 1) / sizes, axis=0)
+    return stats.xs('mean', axis=1, level=1), variances, sizes
+
+
+def assert_profile_equal(profile, expected):
+    means, variances, counts = profile
+    expected_means, expected_variances, expected_counts = expected
+    np.testing.assert_array_equal(counts.index, expected_counts.index)
+    np.testing.assert_array_equal(counts.to_numpy(), expected_counts.to_numpy())
+    np.testing.assert_allclose(means.to_numpy(), expected_means.to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(variances.to_numpy(), expected_variances.to_numpy(), rtol=1e-6, atol=1e-9)
+
+
+@pytest.mark.parametrize('by', cube.LABEL_COLUMNS)
+@pytest.mark.parametrize('age_range', [(15, 80), (25, 40), (33, 33)])
+def test_age_profile_matches_pandas(aggregates, frame, by, age_range):
+    lo, hi = age_range
+    selected = frame[frame['customer_age'].between(lo, hi)]
+    assert_profile_equal(aggregates.profile(age_range, by=by), expected_profile(selected, by))
+
+
+@pytest.mark.parametrize('by', cube.LABEL_COLUMNS)
+def test_row_profile_matches_pandas(customer_store, frame, by):
+    mask = frame['customer_age'].between(25, 40).to_numpy() & (np.asarray(customer_store.column('Recency')) < 50)
+    rows = np.flatnonzero(mask)
+    profile = cube.row_profile(customer_store, rows, FEATURES, by=by)
+    assert_profile_equal(profile, expected_profile(frame.iloc[rows], by))
+
+
+def test_empty_age_range(aggregates):
+    _, _, counts = aggregates.profile((90, 95))
+    assert counts.sum() == 0
+
+
+def test_totals_match_pandas(aggregates, frame):
+    means, stds = aggregates.totals()
+    pd.testing.assert_series_equal(means, frame[FEATURES].mean(), check_names=False)
+    pd.testing.assert_series_equal(stds, frame[FEATURES].std(ddof=0), check_names=False)
@@ -0,0 +1,33 @@
+"""``NeighbourGraph`` DBSCAN labels against scikit-learn's ``DBSCAN``."""
+import numpy as np
+import pytest
+from sklearn.cluster import DBSCAN
+
+from density import NeighbourGraph
+
+
+@pytest.fixture(scope='module')
+def data(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    centres = rng.uniform(-4, 4, size=(5, 3))
+    X = np.concatenate([rng.normal(c, 0.6, size=(300, 3)) for c in centres] + [rng.uniform(-6, 6, size=(200, 3))])
+    graph = NeighbourGraph.build(X, 1.0, str(tmp_path_factory.mktemp('graphs') / 'graph'))
+    return X, graph
+
+
+@pytest.mark.parametrize('eps', [0.3, 0.5, 1.0])
+@pytest.mark.parametrize('min_samples', [3, 10, 25])
+def test_labels_match_sklearn(data, eps, min_samples):
+    X, graph = data
+    expected = DBSCAN(eps=eps, min_samples=min_samples).fit_predict(X)
+    np.testing.assert_array_equal(graph.labels(eps, min_samples), expected)
+
+
+def test_blocked_build_matches_single_block(data, tmp_path, monkeypatch):
+    X, graph = data
+    # Blocks of a few rows and edges exercise the block boundaries of the build
+    monkeypatch.setattr('density.BLOCK_ROWS', 7)
+    monkeypatch.setattr('density.BLOCK_EDGES', 50)
+    blocked = NeighbourGraph.build(X, 1.0, str(tmp_path / 'graph'))
+    for name in ['indptr', 'indices', 'distances', 'k_distances']:
+        np.testing.assert_array_equal(getattr(blocked, name), getattr(graph, name))
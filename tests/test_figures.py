@@ -0,0 +1,36 @@
+"""Row selection of the customer scatter."""
+import numpy as np
+import pytest
+
+import figures
+import sorted_index
+
+
+@pytest.fixture(scope='module')
+def indexes(customer_store):
+    return {
+        column: sorted_index.SortedColumnIndex(customer_store, column)
+        for column in ['customer_age', 'Recency']
+    }
+
+
+def test_no_ranges_selects_every_customer(customer_store, indexes):
+    rows, n_selected, filtered = figures.select_rows(customer_store, indexes, {}, {}, 10 ** 6, 'sample')
+    np.testing.assert_array_equal(filtered, np.arange(len(customer_store)))
+    assert n_selected == len(rows) == len(customer_store)
+
+
+def test_zoom_without_ranges(customer_store, indexes):
+    zoom = {'Recency': (10.0, 50.0)}
+    rows, n_selected, _ = figures.select_rows(customer_store, indexes, {}, zoom, 10 ** 6, 'sample')
+    recency = np.asarray(customer_store.column('Recency'))
+    np.testing.assert_array_equal(rows, np.flatnonzero((recency >= 10) & (recency <= 50)))
+    assert n_selected == len(rows)
+
+
+def test_selection_above_budget_is_sampled(customer_store, indexes):
+    rows, n_selected, filtered = figures.select_rows(
+        customer_store, indexes, {'customer_age': (25, 40)}, {}, 500, 'sample'
+    )
+    assert n_selected == len(filtered) > len(rows) >= 500
+    assert np.isin(rows, filtered).all()
@@ -0,0 +1,29 @@
+"""``weighted_ward`` against scipy's ward linkage."""
+import numpy as np
+from scipy.cluster.hierarchy import cut_tree, linkage
+from sklearn.metrics import adjusted_rand_score
+
+from hierarchy import weighted_ward
+
+
+def test_unit_weights_match_scipy_ward():
+    X = np.random.default_rng(0).normal(size=(300, 4))
+    Z = weighted_ward(X, np.ones(len(X)))
+    reference = linkage(X, 'ward')
+
+    np.testing.assert_allclose(np.sort(Z[:, 2]), np.sort(reference[:, 2]), rtol=1e-10)
+    for k in range(2, 10):
+        labels = cut_tree(Z, n_clusters=k).ravel()
+        expected = cut_tree(reference, n_clusters=k).ravel()
+        assert adjusted_rand_score(labels, expected) == 1.0
+
+
+def test_weights_match_repeated_points():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(60, 3))
+    weights = rng.integers(1, 5, size=len(X))
+    Z = weighted_ward(X, weights.astype(float))
+    reference = linkage(np.repeat(X, weights, axis=0), 'ward')
+
+    # Copies of a point merge first at height zero; the remaining merges are the weighted tree
+    np.testing.assert_allclose(np.sort(Z[:, 2]), np.sort(reference[:, 2])[-(len(X) - 1):], rtol=1e-10)
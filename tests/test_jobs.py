@@ -0,0 +1,50 @@
+"""Re-submission rules of ``JobManager``."""
+import pytest
+
+import jobs
+import result_cache
+
+
+@pytest.fixture
+def manager():
+    return jobs.JobManager(max_workers=1)
+
+
+def wait(job):
+    while not job.done:
+        pass
+    return job
+
+
+def fail(progress=None):
+    raise ValueError('boom')
+
+
+def test_failed_job_is_kept_until_retried(manager):
+    job = wait(manager.submit('key', fail))
+    assert job.status == jobs.FAILED
+
+    again = manager.submit('key', fail)
+    assert again is job and isinstance(again.error, ValueError)
+
+    retried = wait(manager.submit('key', lambda progress=None: 42, retry=True))
+    assert retried is not job
+    assert retried.status == jobs.DONE and retried.result == 42
+
+
+def test_retry_keeps_successful_job(manager):
+    job = wait(manager.submit('key', lambda progress=None: 1))
+    assert manager.submit('key', lambda progress=None: 2, retry=True) is job
+
+
+def test_cached_result_is_read_from_the_cache(manager, tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path))
+    compute = lambda progress=None: cache.get_or_compute('key', lambda: [1, 2, 3])
+
+    job = wait(manager.submit('key', compute, cache=cache))
+    assert job._result is None and job.result == [1, 2, 3]
+
+    # An evicted result is computed again on the next submit
+    cache.clear()
+    again = wait(manager.submit('key', compute, cache=cache))
+    assert again is not job and again.result == [1, 2, 3]
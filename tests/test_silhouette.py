@@ -0,0 +1,32 @@
+"""``silhouette_samples`` against scikit-learn's."""
+import numpy as np
+import pytest
+from sklearn import metrics
+
+import silhouette
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(900, 4))
+    labels = rng.integers(0, 5, size=len(X))
+    labels[:3] = 7  # a small cluster with a label gap
+    labels[3] = 9  # a singleton, whose silhouette is 0
+    X[labels == 2] += 2.0
+    return X, labels
+
+
+@pytest.mark.parametrize('working_memory', [0.05, 64])
+def test_samples_match_sklearn(data, working_memory):
+    X, labels = data
+    # A tiny working memory splits the rows into many chunks
+    values = silhouette.silhouette_samples(X, labels, working_memory=working_memory, n_jobs=1)
+    np.testing.assert_allclose(values, metrics.silhouette_samples(X, labels), atol=1e-10)
+
+
+def test_score_matches_sklearn(data):
+    X, labels = data
+    result = silhouette.silhouette(X, labels, n_jobs=1)
+    assert result['exact']
+    assert result['score'] == pytest.approx(metrics.silhouette_score(X, labels), abs=1e-10)